@@ -0,0 +1,52 @@
+"""
+Settings of the recipe API benchmark
+Everything runs in the process on SQLite and the local memory cache,
+so `python manage.py benchmark` needs no database server or network:
+
+    DJANGO_SETTINGS_MODULE=app.benchmark_settings python manage.py benchmark
+"""
+import tempfile
+from pathlib import Path
+
+from app.settings import *  # noqa
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver']
+
+# database and uploads of a run, kept out of the working tree
+WORK_DIR = tempfile.mkdtemp(prefix='recipe-benchmark-')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': str(Path(WORK_DIR) / 'benchmark.sqlite3'),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+TOKEN_AUTH_CACHE = {**TOKEN_AUTH_CACHE, 'SHARED_CACHE': None}  # noqa
+
+RECIPE_RESPONSE_CACHE = {  # noqa
+    **RECIPE_RESPONSE_CACHE,  # noqa
+    'ENABLED': False,
+    'CONDITIONAL': False,
+    'ALIAS': 'default',
+}
+
+# uploads are processed in the request so no thread outlives its scenario
+RECIPE_IMAGES = {**RECIPE_IMAGES, 'SYNC': True}  # noqa
+
+MEDIA_ROOT = str(Path(WORK_DIR) / 'media')
+
+# a benchmark sends far more requests than any rate limit allows
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}  # noqa
+API_THROTTLE = {'ENABLED': False, 'SHARED_CACHE': None}
+
+# seeding creates users, the default hasher would dominate its time
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +92,37 @@ DATABASES = {
     }
 }
 
+# connections are reused from a pool of each process when DB_POOL=1
+if os.environ.get('DB_POOL') == '1':
+    DATABASES['default'].update({
+        'ENGINE': 'core.db.pooled',
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'IDLE_TIMEOUT': int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'HEALTH_CHECK': os.environ.get('DB_POOL_HEALTH_CHECK') != '0',
+        },
+    })
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+    }
+
+
+# keeps caches shared with other processes out of tests
+TEST_RUNNER = 'app.test_runner.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -142,8 +175,93 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
         'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+        'DEFAULT_RENDERER_CLASSES': [
+            'core.renderers.ORJSONRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
+        ],
+        'DEFAULT_PARSER_CLASSES': [
+            'core.parsers.ORJSONParser',
+            'rest_framework.parsers.FormParser',
+            'rest_framework.parsers.MultiPartParser',
+        ],
+        'DEFAULT_THROTTLE_CLASSES': [
+            'core.throttling.TokenBucketThrottle',
+        ],
+        # requests per period of every bucket, see core.throttling
+        'DEFAULT_THROTTLE_RATES': {
+            'user': os.environ.get('THROTTLE_USER', '600/min'),
+            'anon': os.environ.get('THROTTLE_ANON', '60/min'),
+            'create': os.environ.get('THROTTLE_CREATE', '60/min'),
+            'upload': os.environ.get('THROTTLE_UPLOAD', '20/min'),
+            'token': os.environ.get('THROTTLE_TOKEN', '10/min'),
+        },
+        # proxies in front of the app trusted to set X-Forwarded-For,
+        # 0 keys anonymous clients on the address of the connection
+        'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
         }
 
+# MessagePack is served when the optional msgpack package is installed
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'core.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'core.parsers.MessagePackParser')
+
 SPECTACULAR_SETTINGS = {
     'SPECTACULAR_SPLIT_REQUEST': True
-}
\ No newline at end of file
+}
+
+# schema written by the build_schema command and served by api/schema/
+OPENAPI_SCHEMA_FILE = os.environ.get(
+    'OPENAPI_SCHEMA_FILE', BASE_DIR / 'openapi-schema.json')
+
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_CACHE_TTL', 30)),
+    'SHARED_CACHE': 'shared' if 'shared' in CACHES else None,
+}
+
+API_THROTTLE = {
+    'ENABLED': os.environ.get('API_THROTTLE', '1') == '1',
+    # without a shared cache every worker has its own buckets, which
+    # multiplies the limits by the number of workers but still bounds
+    # password guessing
+    'SHARED_CACHE': 'shared' if 'shared' in CACHES else None,
+}
+
+ACCESS_TOKEN = {
+    'TTL': int(os.environ.get('ACCESS_TOKEN_TTL', 300)),
+    'REFRESH_TTL': int(os.environ.get('REFRESH_TOKEN_TTL', 30 * 86400)),
+}
+
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('REQUEST_METRICS', '1') == '1',
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING') == '1',
+    'EXPORT': os.environ.get('METRICS_EXPORT') == '1',
+    'EXPORT_TOKEN': os.environ.get('METRICS_TOKEN') or None,
+}
+
+RECIPE_RESPONSE_CACHE = {
+    # a cache local to each worker can not be invalidated by the others
+    'ENABLED': 'shared' in CACHES,
+    'CONDITIONAL': 'shared' in CACHES,
+    'ALIAS': 'shared' if 'shared' in CACHES else 'default',
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+RECIPE_EXPORT = {
+    'ASGI_MAX_ROWS': int(os.environ.get('EXPORT_ASGI_MAX_ROWS', 10000)),
+}
+
+RECIPE_IMAGES = {
+    'WORKERS': int(os.environ.get('IMAGE_WORKERS', 2)),
+    'MAX_SIZE': int(os.environ.get('IMAGE_MAX_SIZE', 1600)),
+    'QUALITY': int(os.environ.get('IMAGE_QUALITY', 85)),
+    'RECOVER_AFTER': int(os.environ.get('IMAGE_RECOVER_AFTER', 600)),
+}
+
+# build the recipe list from values() rows instead of serializers
+RECIPE_FAST_LIST = os.environ.get('RECIPE_FAST_LIST') == '1'
+
+# serve cached reads from async views, for ASGI deployments
+RECIPE_ASYNC_READS = os.environ.get('RECIPE_ASYNC_READS') == '1'
@@ -0,0 +1,33 @@
+"""
+Test runner of the project
+"""
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+# Caches shared with other processes are replaced, a Redis of the
+# environment would keep responses, tokens and buckets across tests.
+# Version bumps of the response cache run on commit, which TestCase
+# never does, so it is off. Tests of these features enable them.
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    },
+    'TOKEN_AUTH_CACHE': {'SHARED_CACHE': None},
+    'API_THROTTLE': {'ENABLED': False, 'SHARED_CACHE': None},
+    'RECIPE_RESPONSE_CACHE': {
+        'ENABLED': False, 'CONDITIONAL': False, 'ALIAS': 'default'},
+}
+
+
+class TestRunner(DiscoverRunner):
+    """runs tests with TEST_SETTINGS whatever the environment"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.pinned_settings = override_settings(**TEST_SETTINGS)
+        self.pinned_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.pinned_settings.disable()
+        super().teardown_test_environment(**kwargs)
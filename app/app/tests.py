@@ -1,6 +1,7 @@
 """ sample test"""
 
 
+from django.conf import settings
 from django.test import SimpleTestCase
 from app import calc
 
@@ -15,3 +16,14 @@ class CalcTests(SimpleTestCase):
     def test_substract(self):
         res = calc.subtract(1, 6)
         self.assertEqual(res, 5)
+
+
+class TestRunnerTests(SimpleTestCase):
+    """Test settings pinned by the test runner"""
+
+    def test_shared_caches_are_left_out(self):
+        """Test a Redis of the environment is not used by tests."""
+        self.assertEqual(list(settings.CACHES), ['default'])
+        self.assertIsNone(settings.TOKEN_AUTH_CACHE['SHARED_CACHE'])
+        self.assertFalse(settings.API_THROTTLE['ENABLED'])
+        self.assertFalse(settings.RECIPE_RESPONSE_CACHE['ENABLED'])
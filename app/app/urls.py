@@ -13,22 +13,23 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from drf_spectacular.views import (
-        SpectacularAPIView,
-        SpectacularSwaggerView,)
+from drf_spectacular.views import SpectacularSwaggerView
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import CachedSchemaView, metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api_schema'),
+    path('api/schema/', CachedSchemaView.as_view(), name='api_schema'),
     path('api/docs/',
          SpectacularSwaggerView.as_view(url_name='api_schema'),
          name='api_docs'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path('metrics', metrics_view, name='metrics'),
     ]
 
 
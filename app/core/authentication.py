@@ -0,0 +1,315 @@
+"""
+Authentication classes for the API
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext as _
+
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header, )
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULTS = {
+    # number of tokens kept in the in-process cache
+    'MAX_SIZE': 10000,
+    # seconds a cached token is trusted without reading the database
+    'TTL': 30,
+    # alias from CACHES shared by all workers, None to disable
+    'SHARED_CACHE': None,
+}
+
+ACCESS_TOKEN_DEFAULTS = {
+    # seconds a signed access token is valid
+    'TTL': 300,
+    # seconds a refresh token is valid, each refresh returns a new one
+    'REFRESH_TTL': 30 * 86400,
+}
+
+# keep signatures of access and refresh tokens apart from each other
+# and from other signed values
+ACCESS_TOKEN_SALT = 'core.authentication.access-token'
+REFRESH_TOKEN_SALT = 'core.authentication.refresh-token'
+
+
+class LRUCache:
+    """Bounded thread safe mapping whose entries expire after ttl."""
+
+    def __init__(self, max_size, ttl) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        """return value of key or None when missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        """store value and evict the least recently used entries"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def user_stub(pk, **flags) -> Any:
+    """
+    Return an unsaved user holding only the primary key and flags,
+    views needing more of the user call load_user.
+    """
+    user = get_user_model()(pk=pk, **flags)
+    user.is_token_stub = True
+    return user
+
+
+class TokenCache:
+    """
+    Two tier cache of token key to (user, token), the user is a stub
+    from user_stub so no password hash is kept or sent to the cache.
+    The local tier lives in the process, the optional shared tier is
+    a Django cache so a miss in one worker can be served by another.
+    """
+
+    def __init__(self) -> None:
+        options = {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+        self.ttl = options['TTL']
+        self.local = LRUCache(options['MAX_SIZE'], self.ttl)
+        alias = options['SHARED_CACHE']
+        self.shared = caches[alias] if alias else None
+
+    @staticmethod
+    def shared_key(key) -> str:
+        """return shared cache key, raw tokens are never stored as keys"""
+        return 'authtoken:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key) -> Optional[tuple]:
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(self.shared_key(key))
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, key, entry) -> None:
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), entry, self.ttl)
+
+    def delete(self, key) -> None:
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self.shared_key(key))
+
+
+_token_cache: Optional[TokenCache] = None
+
+
+def get_token_cache() -> TokenCache:
+    """return the process wide token cache"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache()
+    return _token_cache
+
+
+def _reset_token_cache(*, setting, **kwargs) -> None:
+    """rebuild token cache when its settings change"""
+    global _token_cache
+    if setting in ('TOKEN_AUTH_CACHE', 'CACHES'):
+        _token_cache = None
+
+
+setting_changed.connect(_reset_token_cache)
+
+
+def invalidate_token(key) -> None:
+    """drop one token from every cache tier of this process"""
+    get_token_cache().delete(key)
+
+
+def invalidate_user_tokens(user_id) -> None:
+    """drop all tokens of user"""
+    keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    for key in keys:
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that skips the Token and User query
+    while the token is cached. Tokens are dropped from the cache when
+    they are deleted or their user is saved, other workers see the
+    change once the local entry expires after TTL seconds.
+    request.user is a stub, see user_stub.
+    """
+
+    def authenticates_from_cache(self, request) -> bool:
+        """
+        Return whether authenticate runs without any query. The entry
+        found is kept for authenticate, it could expire in between.
+        """
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            # anonymous or malformed, answered without the database
+            return True
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            return True
+        entry = get_token_cache().get(key)
+        if entry is None:
+            return False
+        self._cached = (key, entry)
+        return True
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cached = getattr(self, '_cached', None)
+        entry = cached[1] if cached and cached[0] == key \
+            else token_cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            user = user_stub(user.pk, is_active=user.is_active,
+                             is_staff=user.is_staff)
+            entry = (user, Token(key=token.key, user=user,
+                                 created=token.created))
+            token_cache.set(key, entry)
+        user, token = entry
+        # every request gets its own user, views are free to change it
+        return copy.copy(user), token
+
+
+def get_access_token_options() -> dict[str, Any]:
+    return {**ACCESS_TOKEN_DEFAULTS, **getattr(settings, 'ACCESS_TOKEN', {})}
+
+
+def issue_access_token(user) -> tuple[str, int]:
+    """return a signed access token of user and its lifetime in seconds"""
+    ttl = get_access_token_options()['TTL']
+    token = signing.dumps(
+        {'uid': user.pk, 'exp': int(time.time()) + ttl},
+        salt=ACCESS_TOKEN_SALT)
+    return token, ttl
+
+
+def _token_digest(key) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue_refresh_token(token) -> str:
+    """
+    Return a signed refresh token bound to the Token of a user.
+    It only renews access tokens, is no credential for other
+    endpoints, and is revoked by deleting that Token.
+    """
+    ttl = get_access_token_options()['REFRESH_TTL']
+    return signing.dumps(
+        {'uid': token.user_id, 'key': _token_digest(token.key),
+         'exp': int(time.time()) + ttl},
+        salt=REFRESH_TOKEN_SALT)
+
+
+def read_refresh_token(value) -> Optional[Token]:
+    """return the Token of an unexpired refresh token, None if revoked"""
+    try:
+        payload = signing.loads(value, salt=REFRESH_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if payload['exp'] < time.time():
+        return None
+    token = Token.objects.select_related('user').filter(
+        user_id=payload['uid']).first()
+    if token is None or not constant_time_compare(
+            _token_digest(token.key), payload['key']):
+        return None
+    return token
+
+
+def load_user(user) -> Any:
+    """
+    Return the stored user of an authenticated request user,
+    reading the user of a signed access token from the database.
+    """
+    if not getattr(user, 'is_token_stub', False):
+        return user
+    try:
+        return get_user_model().objects.get(pk=user.pk, is_active=True)
+    except get_user_model().DoesNotExist:
+        raise AuthenticationFailed(_('User inactive or deleted.'))
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authentication by short lived access tokens, see issue_access_token.
+    The token carries the user id and its expiry signed with SECRET_KEY,
+    so reads are verified without any query. request.user is an unsaved
+    user holding only the primary key, views needing more of the user
+    call load_user. A deactivated user keeps read access until expiry,
+    writes load the user so they are refused once it is gone.
+
+    Clients should authenticate by passing the token in the header:
+
+        Authorization: Bearer <access token>
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed(_('Invalid token header.'))
+        try:
+            payload = signing.loads(auth[1].decode(), salt=ACCESS_TOKEN_SALT)
+        except (UnicodeError, signing.BadSignature):
+            raise AuthenticationFailed(_('Invalid token.'))
+        if payload['exp'] < time.time():
+            raise AuthenticationFailed(_('Token has expired.'))
+        user = user_stub(payload['uid'])
+        if request.method not in SAFE_METHODS:
+            # rows written would reference a user that may be deleted
+            user = load_user(user)
+        return user, payload
+
+    def authenticate_header(self, request) -> str:
+        return self.keyword
+
+    def authenticates_from_cache(self, request) -> bool:
+        """verifying a signature needs no query"""
+        return True
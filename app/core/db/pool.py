@@ -0,0 +1,164 @@
+"""
+Pool of database connections shared by the threads of a process
+"""
+import threading
+import time
+from typing import Any, Callable, Optional
+
+DEFAULTS = {
+    # most connections open at once, in use or idle
+    'MAX_SIZE': 10,
+    # seconds an unused connection is kept open
+    'IDLE_TIMEOUT': 300,
+    # seconds a checkout waits for a free connection
+    'TIMEOUT': 10,
+    # test connections with a query before they are handed out
+    'HEALTH_CHECK': True,
+}
+
+
+class PoolTimeout(Exception):
+    """no connection was released before the checkout timeout"""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections.
+    The most recently released connection is handed out first,
+    so rarely used ones reach the idle timeout and get closed.
+    Connections are opened, checked and closed outside of the lock.
+    """
+
+    def __init__(self, max_size=10, idle_timeout=300, timeout=10,
+                 check: Optional[Callable[[Any], bool]] = None) -> None:
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.check = check
+        # (release time, connection), oldest first
+        self._idle: list[tuple[float, Any]] = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.failed_checks = 0
+
+    def acquire(self, connect: Callable[[], Any]) -> Any:
+        """return a pooled connection or a new one made by connect"""
+        conn, expired = self._checkout()
+        self._close_all(expired)
+        if conn is not None and self.check is not None \
+                and not self.check(conn):
+            with self._cond:
+                self.failed_checks += 1
+            self._close_all([conn])
+            conn = None
+        if conn is None:
+            try:
+                conn = connect()
+            except BaseException:
+                self._discard_slot()
+                raise
+            with self._cond:
+                self.created += 1
+        return conn
+
+    def release(self, conn, discard=False) -> None:
+        """give conn back to the pool, a discarded one is closed"""
+        with self._cond:
+            if not discard:
+                self._idle.append((time.monotonic(), conn))
+                self._cond.notify()
+                return
+        self._close_all([conn])
+        self._discard_slot()
+
+    def close_idle(self) -> None:
+        """close every connection not in use"""
+        with self._cond:
+            idle = [conn for _, conn in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self) -> dict[str, Any]:
+        """return counters of the pool"""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'closed': self.closed,
+                'failed_checks': self.failed_checks,
+            }
+
+    def _checkout(self) -> tuple[Any, list]:
+        """
+        Return an idle connection, or None when a new one may be opened,
+        and the expired connections to close.
+        """
+        started = None
+        expired: list = []
+        with self._cond:
+            while True:
+                expired += self._pop_expired()
+                if self._idle:
+                    conn = self._idle.pop()[1]
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                now = time.monotonic()
+                if started is None:
+                    started = now
+                    self.waits += 1
+                remaining = self.timeout - (now - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self.wait_time += now - started
+                    raise PoolTimeout(
+                        f'no free connection after {self.timeout} seconds, '
+                        f'all {self.max_size} are in use')
+                self._cond.wait(remaining)
+            self.checkouts += 1
+            if started is not None:
+                self.wait_time += time.monotonic() - started
+        return conn, expired
+
+    def _pop_expired(self) -> list:
+        """remove idle connections unused for longer than idle_timeout"""
+        limit = time.monotonic() - self.idle_timeout
+        count = 0
+        while count < len(self._idle) and self._idle[count][0] < limit:
+            count += 1
+        expired = [conn for _, conn in self._idle[:count]]
+        del self._idle[:count]
+        self._size -= count
+        return expired
+
+    def _discard_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _close_all(self, connections) -> None:
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if connections:
+            with self._cond:
+                self.closed += len(connections)
@@ -0,0 +1,134 @@
+"""
+PostgreSQL backend that reuses connections from a process wide pool
+Enabled with ENGINE 'core.db.pooled', pool options are read from
+the POOL key of the database settings, see core.db.pool.DEFAULTS.
+"""
+import threading
+from typing import Any
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation
+
+from core.db.pool import DEFAULTS, ConnectionPool, PoolTimeout
+
+Database = base.Database
+
+_pools: dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def is_healthy(conn) -> bool:
+    """return whether conn still answers a query"""
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if conn.info.transaction_status != \
+                Database.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+def reset(conn) -> bool:
+    """end the transaction left open on conn, false if it is unusable"""
+    if conn.closed:
+        return False
+    status = conn.info.transaction_status
+    if status == Database.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != Database.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except Database.Error:
+            return False
+    return True
+
+
+def get_pool(alias, settings_dict, conn_params) -> ConnectionPool:
+    """return the pool of connections made with conn_params"""
+    key = (alias, tuple(sorted(
+        (name, repr(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+            pool = _pools[key] = ConnectionPool(
+                max_size=options['MAX_SIZE'],
+                idle_timeout=options['IDLE_TIMEOUT'],
+                timeout=options['TIMEOUT'],
+                check=is_healthy if options['HEALTH_CHECK'] else None)
+        return pool
+
+
+def get_pool_stats() -> dict[str, dict[str, Any]]:
+    """return counters of every pool of this process by alias"""
+    stats: dict[str, dict[str, Any]] = {}
+    with _pools_lock:
+        pools = list(_pools.items())
+    for (alias, _), pool in pools:
+        total = stats.setdefault(alias, {})
+        for name, value in pool.stats().items():
+            total[name] = value if name == 'max_size' else \
+                total.get(name, 0) + value
+    return stats
+
+
+def close_pools(dbname=None) -> None:
+    """close idle connections of every pool, or of the pools of dbname"""
+    with _pools_lock:
+        pools = [pool for (_, params), pool in _pools.items()
+                 if dbname is None or ('database', repr(dbname)) in params]
+    for pool in pools:
+        pool.close_idle()
+
+
+class PooledDatabaseCreation(DatabaseCreation):
+    """creation of test databases with pooled connections"""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # pooled connections would keep the database in use
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Connections are checked out of the pool instead of opened
+    and given back instead of closed, so CONN_MAX_AGE can stay 0.
+    The transaction state is reset on release and a health check
+    runs on checkout.
+    """
+    creation_class = PooledDatabaseCreation
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        if self.alias == NO_DB_ALIAS:
+            # maintenance connections to create databases are not kept
+            return super().get_new_connection(conn_params)
+        pool = get_pool(self.alias, self.settings_dict, conn_params)
+        try:
+            conn = pool.acquire(
+                lambda: base.DatabaseWrapper.get_new_connection(
+                    self, conn_params))
+        except PoolTimeout as exc:
+            raise Database.OperationalError(str(exc))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', conn.isolation_level)
+        self.pool = pool
+        return conn
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        # the wrapper keeps a connection closed inside an atomic block,
+        # so it can not be handed to another thread
+        discard = self.in_atomic_block or not reset(self.connection)
+        pool.release(self.connection, discard=discard)
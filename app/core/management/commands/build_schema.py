@@ -0,0 +1,24 @@
+"""
+    Command for building the OpenAPI schema served by the API
+"""
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema for the current code version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=None,
+            help='path of the schema file, OPENAPI_SCHEMA_FILE by default')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if schema.read_schema(options['file']) is not None:
+            self.stdout.write('schema is up to date.')
+            return
+        path = schema.write_schema(options['file'])
+        self.stdout.write(self.style.SUCCESS(
+            f'schema of version {schema.code_version()} written to {path}'))
@@ -0,0 +1,48 @@
+"""
+    Command for filling the database with synthetic data
+"""
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import seeding
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic users, tags, ingredients and recipes, '
+            'written in batches with COPY or bulk inserts.')
+
+    def add_arguments(self, parser):
+        for name, default in seeding.DEFAULTS.items():
+            parser.add_argument(
+                f'--{name.replace("_", "-")}', dest=name, default=default,
+                type=type(default), help=f'default {default}')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='writing processes, PostgreSQL only')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.elapsed = 0.0
+        workers = options['workers']
+        if workers > 1 and not seeding.supports_workers(connection):
+            self.stdout.write(
+                f'{connection.vendor} allows one writer, using one process.')
+            workers = 1
+        totals = seeding.seed(
+            {name: options[name] for name in seeding.DEFAULTS},
+            workers, report=self.report)
+        rows = sum(totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} rows in {self.elapsed:.1f}s, '
+            f'{rows / self.elapsed if self.elapsed else 0:.0f} rows/s'))
+
+    def report(self, phase, written, elapsed):
+        self.elapsed += elapsed
+        rows = sum(written.values())
+        tables = ', '.join(
+            f'{count} {table}' for table, count in written.items())
+        self.stdout.write(
+            f'{phase}: {tables or "nothing"} in {elapsed:.1f}s, '
+            f'{rows / elapsed if elapsed else 0:.0f} rows/s')
@@ -0,0 +1,296 @@
+"""
+Per request performance metrics
+Every request measured by RequestMetricsMiddleware gets its SQL query
+count and time, serializer and render time and response size recorded
+in histograms by view and action. Histograms live in the process and
+are exported in the Prometheus text format, every worker is scraped
+on its own.
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    # send the measures of each response in a Server-Timing header,
+    # they tell clients about the queries run
+    'SERVER_TIMING': False,
+    # serve the histograms at /metrics
+    'EXPORT': False,
+    # bearer token of scrapers of /metrics, without one only staff
+    # users signed in to the admin may read it
+    'EXPORT_TOKEN': None,
+}
+
+TIME_BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def get_options() -> dict[str, Any]:
+    """return request metrics settings"""
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class RequestTimings:
+    """Measures of the request being served, times in seconds."""
+    __slots__ = ('queries', 'db', 'serialize', 'render', 'serializing')
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.serializing = False
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    'request_timings', default=None)
+
+
+def get_timings() -> Optional[RequestTimings]:
+    """return measures of the current request, None if not measured"""
+    return _timings.get()
+
+
+def set_timings(timings) -> Any:
+    """make timings the measures of the current context"""
+    return _timings.set(timings)
+
+
+def reset_timings(token) -> None:
+    _timings.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """database execute wrapper counting queries and their time"""
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+def install_query_wrapper(connection) -> None:
+    """
+    Make connection record its queries in the current measures.
+    Connections belong to a thread, so the wrapper is installed once
+    for good and finds the measures of the request in the context.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed(name) -> Callable:
+    """decorator adding the run time of a function to measure name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(timings, name,
+                        getattr(timings, name) + time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class TimedSerializerMixin:
+    """
+    Add the time spent in to_representation to the serialize measure.
+    Only the outermost serializer is timed, so nested serializers
+    are not counted twice.
+    """
+
+    def to_representation(self, instance):
+        timings = _timings.get()
+        if timings is None or timings.serializing:
+            return super().to_representation(instance)
+        timings.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timings.serializing = False
+            timings.serialize += time.perf_counter() - start
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    pairs = (
+        '%s="%s"' % (name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+    return '{%s}' % ','.join(pairs)
+
+
+def format_metric(name, kind, documentation, samples) -> Iterator[str]:
+    """
+    Yield exposition lines of metric name,
+    samples are (labels, value) pairs, labels a dict.
+    """
+    yield f'# HELP {name} {documentation}'
+    yield f'# TYPE {name} {kind}'
+    for labels, value in samples:
+        yield f'{name}{_format_labels(labels.items())} {_format_value(value)}'
+
+
+class Histogram:
+    """Prometheus histogram with a series per set of label values."""
+
+    def __init__(self, name, documentation, buckets,
+                 labels=('view', 'action')) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def collect(self) -> Iterator[str]:
+        """yield exposition lines of every series"""
+        with self._lock:
+            series = sorted(
+                (values, list(counts), total)
+                for values, (counts, total) in self._series.items())
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for values, counts, total in series:
+            labels = list(zip(self.labels, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    labels + [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(labels)} ' \
+                f'{_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(labels)} {cumulative}'
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'Time to build the response.', TIME_BUCKETS)
+request_queries = Histogram(
+    'http_request_queries', 'SQL queries run by the request.', QUERY_BUCKETS)
+request_db = Histogram(
+    'http_request_db_seconds', 'Time spent in SQL queries.', TIME_BUCKETS)
+request_serialize = Histogram(
+    'http_request_serialize_seconds', 'Time spent in serializers.',
+    TIME_BUCKETS)
+request_render = Histogram(
+    'http_request_render_seconds', 'Time spent in renderers.', TIME_BUCKETS)
+response_size = Histogram(
+    'http_response_size_bytes', 'Size of the response body.', SIZE_BUCKETS)
+
+HISTOGRAMS = (request_duration, request_queries, request_db,
+              request_serialize, request_render, response_size)
+
+
+def observe(view, action, timings, duration, size) -> None:
+    """record the measures of a served request"""
+    request_duration.observe(duration, view, action)
+    request_queries.observe(timings.queries, view, action)
+    request_db.observe(timings.db, view, action)
+    request_serialize.observe(timings.serialize, view, action)
+    request_render.observe(timings.render, view, action)
+    if size is not None:
+        response_size.observe(size, view, action)
+
+
+def token_cache_metrics() -> Iterator[str]:
+    from core.authentication import get_token_cache
+    yield from format_metric(
+        'token_cache_entries', 'gauge',
+        'Tokens in the local token cache.',
+        [({}, len(get_token_cache().local))])
+
+
+# counters of core.db.pool.ConnectionPool.stats, the others are gauges
+POOL_COUNTERS = {
+    'checkouts': 'Connections handed out.',
+    'waits': 'Checkouts that waited for a connection.',
+    'wait_time': 'Seconds checkouts waited for a connection.',
+    'timeouts': 'Checkouts that timed out.',
+    'created': 'Connections opened.',
+    'closed': 'Connections closed.',
+    'failed_checks': 'Connections failing the health check.',
+}
+POOL_GAUGES = {
+    'max_size': 'Connections the pool may open.',
+    'size': 'Open connections.',
+    'idle': 'Idle connections.',
+    'in_use': 'Connections in use.',
+}
+
+
+def pool_metrics() -> Iterator[str]:
+    if not any(database['ENGINE'] == 'core.db.pooled'
+               for database in settings.DATABASES.values()):
+        return
+    from core.db.pooled.base import get_pool_stats
+    stats = get_pool_stats()
+    for kind, names in (('counter', POOL_COUNTERS), ('gauge', POOL_GAUGES)):
+        for name, documentation in names.items():
+            metric = f'db_pool_{name}'
+            if kind == 'counter':
+                metric = metric.replace('_time', '_seconds') + '_total'
+            yield from format_metric(metric, kind, documentation, [
+                ({'alias': alias}, values[name])
+                for alias, values in sorted(stats.items())])
+
+
+_collectors: list[Callable[[], Iterable[str]]] = [
+    token_cache_metrics, pool_metrics]
+
+
+def register_collector(collector) -> None:
+    """add a function yielding exposition lines to the exported metrics"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def export() -> str:
+    """return every metric in the Prometheus text format"""
+    lines: list[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
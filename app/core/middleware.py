@@ -0,0 +1,90 @@
+"""
+Middleware shared by the API apps
+"""
+import asyncio
+import time
+
+from asgiref.sync import markcoroutinefunction
+
+from core import metrics
+
+
+def view_labels(request) -> tuple[str, str]:
+    """return view and action names of request for metric labels"""
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved', ''
+    func = match.func
+    method = request.method.lower()
+    cls = getattr(func, 'cls', None)
+    if cls is None:
+        return match.view_name or func.__name__, method
+    actions = getattr(func, 'actions', None) or {}
+    return cls.__name__, actions.get(method, method)
+
+
+def server_timing(timings, duration) -> str:
+    """return Server-Timing header value of the measures, in ms"""
+    return ', '.join((
+        f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+        f'serialize;dur={timings.serialize * 1000:.2f}',
+        f'render;dur={timings.render * 1000:.2f}',
+        f'total;dur={duration * 1000:.2f}',
+    ))
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request, see core.metrics.
+    Works in sync and async mode, under ASGI it adds no thread switch.
+    Place it first so the measures cover the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # mark the instance so Django awaits it
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        options = metrics.get_options()
+        if not options['ENABLED']:
+            return self.get_response(request)
+        timings = metrics.RequestTimings()
+        token = metrics.set_timings(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.reset_timings(token)
+        self.record(request, response, timings, start, options)
+        return response
+
+    async def __acall__(self, request):
+        options = metrics.get_options()
+        if not options['ENABLED']:
+            return await self.get_response(request)
+        timings = metrics.RequestTimings()
+        # sync_to_async copies the context, so views running in a thread
+        # update the same measures
+        token = metrics.set_timings(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.reset_timings(token)
+        self.record(request, response, timings, start, options)
+        return response
+
+    @staticmethod
+    def record(request, response, timings, start, options) -> None:
+        duration = time.perf_counter() - start
+        size = None if response.streaming else len(response.content)
+        metrics.observe(*view_labels(request), timings, duration, size)
+        if options['SERVER_TIMING']:
+            response['Server-Timing'] = server_timing(timings, duration)
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-17 19:42
+
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    """images uploaded before processing existed are served as they are"""
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.exclude(image__isnull=True).exclude(image='').update(
+        image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'None'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=16),
+        ),
+        migrations.RunPython(
+            mark_existing_images_ready, migrations.RunPython.noop),
+    ]
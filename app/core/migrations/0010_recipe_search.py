@@ -0,0 +1,96 @@
+from django.db import migrations
+
+# the search index lives only in the database, Django never reads it.
+# PostgreSQL keeps a weighted tsvector column up to date with a trigger
+# and indexes it with GIN, SQLite keeps an FTS5 table in sync with
+# triggers. Operations that rebuild core_recipe on SQLite drop the
+# triggers, such migrations have to create them again.
+POSTGRESQL_FORWARD = [
+    'ALTER TABLE core_recipe ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION core_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+            || setweight(
+                to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+    FOR EACH ROW EXECUTE FUNCTION core_recipe_search_vector()
+    """,
+    'UPDATE core_recipe SET title = title',
+    'CREATE INDEX core_recipe_search_vector_gin '
+    'ON core_recipe USING gin (search_vector)',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP TRIGGER core_recipe_search_vector_update ON core_recipe',
+    'DROP FUNCTION core_recipe_search_vector()',
+    'ALTER TABLE core_recipe DROP COLUMN search_vector',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_recipe_fts USING fts5(
+        title, description, content='core_recipe', content_rowid='id',
+        tokenize='porter unicode61')
+    """,
+    """
+    CREATE TRIGGER core_recipe_fts_insert AFTER INSERT ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_recipe_fts_delete AFTER DELETE ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(core_recipe_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_recipe_fts_update
+    AFTER UPDATE OF title, description ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(core_recipe_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO core_recipe_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO core_recipe_fts(core_recipe_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER core_recipe_fts_update',
+    'DROP TRIGGER core_recipe_fts_delete',
+    'DROP TRIGGER core_recipe_fts_insert',
+    'DROP TABLE core_recipe_fts',
+]
+
+FORWARD = {'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}
+BACKWARD = {'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}
+
+
+def create_search_index(apps, schema_editor):
+    for sql in FORWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in BACKWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.0.10 on 2026-10-17 19:59
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    keep the oldest tag or ingredient of each user and name,
+    recipes of the others are linked to it before they are deleted
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for field in ('tags', 'ingredients'):
+        relation = Recipe._meta.get_field(field)
+        model = relation.related_model
+        through = relation.remote_field.through
+        target = relation.m2m_reverse_field_name()
+        groups = model.objects.values('user', 'name').annotate(
+            count=Count('id'), keep=Min('id')).filter(count__gt=1)
+        for group in groups:
+            duplicates = model.objects.filter(
+                user=group['user'], name=group['name'],
+            ).exclude(id=group['keep'])
+            recipe_ids = set(through.objects.filter(
+                **{f'{target}__in': duplicates},
+            ).values_list('recipe_id', flat=True))
+            recipe_ids -= set(through.objects.filter(
+                **{f'{target}_id': group['keep']},
+            ).values_list('recipe_id', flat=True))
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{f'{target}_id': group['keep']})
+                for recipe_id in recipe_ids])
+            duplicates.delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # run the deferred foreign key checks of the rows changed above
+        # now, PostgreSQL refuses to alter tables with pending trigger
+        # events, e.g. to add the constraints below
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        schema_editor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_newest_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+    ]
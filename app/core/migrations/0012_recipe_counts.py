@@ -0,0 +1,39 @@
+# Generated by Django 4.0.10 on 2026-10-17 21:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """fill recipe_count of existing tags and ingredients"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for field in ('tags', 'ingredients'):
+        relation = Recipe._meta.get_field(field)
+        target = relation.m2m_reverse_field_name()
+        counts = relation.remote_field.through.objects.filter(
+            **{target: OuterRef('pk')}).order_by().values(target).annotate(
+            count=Count('*')).values('count')
+        relation.related_model.objects.update(
+            recipe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
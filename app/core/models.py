@@ -5,6 +5,8 @@ import os
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
         AbstractBaseUser,
         BaseUserManager,
@@ -59,6 +61,15 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 class Recipe(models.Model):
     """Recipe model"""
+
+    class ImageStatus(models.TextChoices):
+        """states of the background processing of image"""
+        NONE = 'none'
+        PENDING = 'pending'
+        PROCESSING = 'processing'
+        READY = 'ready'
+        FAILED = 'failed'
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE)
@@ -70,17 +81,55 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_status = models.CharField(
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.NONE)
+
+    class Meta:
+        indexes = [
+            # recipe lists are read per user, newest first
+            models.Index(
+                fields=['user', '-id'], name='recipe_user_newest_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title}'
 
 
+class RecipeCountQuerySet(models.QuerySet):
+    """queryset of a model whose rows count the recipes using them"""
+
+    def recount(self) -> int:
+        """
+        Set recipe_count of every row from the relation table in one
+        UPDATE, for writes that bypass the m2m_changed signals.
+        """
+        field = next(field for field in Recipe._meta.many_to_many
+                     if field.related_model is self.model)
+        column = field.m2m_reverse_field_name()
+        counts = field.remote_field.through.objects.filter(
+            **{column: OuterRef('pk')}).order_by().values(column).annotate(
+            count=Count('*')).values('count')
+        return self.update(recipe_count=Coalesce(Subquery(counts), 0))
+
+
 class Tag(models.Model):
     """tag model for filtering recipes"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE)
     name = models.CharField(max_length=255, blank=True)
+    # recipes using the tag, kept by recipe.signals
+    recipe_count = models.IntegerField(default=0)
+
+    objects = RecipeCountQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_tag_name_per_user'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -92,6 +141,17 @@ class Ingredient(models.Model):
             settings.AUTH_USER_MODEL,
             on_delete=models.CASCADE)
     name = models.CharField(max_length=255, blank=True)
+    # recipes using the ingredient, kept by recipe.signals
+    recipe_count = models.IntegerField(default=0)
+
+    objects = RecipeCountQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_ingredient_name_per_user'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -0,0 +1,75 @@
+"""
+Parsers shared by the API apps
+"""
+import orjson
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONParser(JSONParser):
+    """Parse JSON with orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read() if stream is not None else b''
+            if encoding.lower().replace('-', '') != 'utf8':
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """Parse a MessagePack request body."""
+    media_type = 'application/msgpack'
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImproperlyConfigured(
+                'MessagePackParser requires the msgpack package')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(
+                stream.read() if stream is not None else b'',
+                raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parse newline delimited JSON.
+    Rows are decoded lazily while the request body is read,
+    so the body is never held in memory as a whole.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """return an iterator over the rows of the stream"""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self._iter_rows(stream, encoding)
+
+    def _iter_rows(self, stream, encoding):
+        """yield one decoded object per non empty line"""
+        for number, line in enumerate(iter(stream.readline, b''), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield orjson.loads(line.decode(encoding))
+            except ValueError as exc:
+                raise ParseError(
+                    f'NDJSON parse error on line {number} - {exc}')
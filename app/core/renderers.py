@@ -0,0 +1,69 @@
+"""
+Renderers shared by the API apps
+"""
+import orjson
+
+from django.core.exceptions import ImproperlyConfigured
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.metrics import timed
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# values orjson does not handle natively are converted like DRF does,
+# datetimes are passed through so they keep the DRF format
+_encode_default = JSONEncoder().default
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Render JSON with orjson.
+    Output is byte for byte the one of the compact JSONRenderer,
+    indented output and data orjson refuses fall back to it.
+    """
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None \
+                or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=_encode_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same javascript safe escapes as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Render MessagePack, values are converted like in JSON responses
+    so decimals and datetimes keep the same representation.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImproperlyConfigured(
+                'MessagePackRenderer requires the msgpack package')
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=_encode_default, use_bin_type=True, datetime=False)
@@ -0,0 +1,128 @@
+"""
+Precomputed OpenAPI schema
+The schema only changes with the code, so it is generated once per
+code version, by the build_schema command or on first use, and every
+rendering of it is kept in memory together with its gzip and ETag.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+import drf_spectacular
+import rest_framework
+from django.conf import settings
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from drf_spectacular.settings import spectacular_settings
+
+
+class RenderedSchema(NamedTuple):
+    """schema rendered in one format"""
+    content: bytes
+    gzipped: bytes
+    etag: str
+
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """
+    Return version of the code the schema is built from,
+    CODE_VERSION from the environment or a digest of the sources.
+    """
+    version = os.environ.get('CODE_VERSION')
+    if version:
+        return version
+    digest = hashlib.sha1()
+    digest.update(f'{rest_framework.VERSION}:'
+                  f'{drf_spectacular.__version__}'.encode())
+    base = Path(settings.BASE_DIR)
+    for path in sorted(base.rglob('*.py')):
+        if 'tests' in path.parts:
+            continue
+        digest.update(str(path.relative_to(base)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def get_schema_file() -> Path:
+    return Path(getattr(settings, 'OPENAPI_SCHEMA_FILE',
+                        Path(settings.BASE_DIR) / 'openapi-schema.json'))
+
+
+def generate_schema() -> dict[str, Any]:
+    """run the drf-spectacular introspection of the whole API"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        urlconf=spectacular_settings.SERVE_URLCONF)
+    return generator.get_schema(
+        request=None, public=spectacular_settings.SERVE_PUBLIC)
+
+
+def write_schema(path=None) -> Path:
+    """generate the schema and store it with the code version in path"""
+    path = Path(path or get_schema_file())
+    path.write_text(json.dumps(
+        {'version': code_version(), 'schema': generate_schema()}))
+    return path
+
+
+def read_schema(path=None) -> Optional[dict[str, Any]]:
+    """return schema stored in path if it was built from this code"""
+    try:
+        stored = json.loads(Path(path or get_schema_file()).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(stored, dict) or stored.get('version') != code_version():
+        return None
+    return stored.get('schema')
+
+
+class SchemaStore:
+    """Schema of this process and its renderings by media type."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._schema: Optional[dict[str, Any]] = None
+        self._rendered: dict[str, RenderedSchema] = {}
+
+    def get_schema(self) -> dict[str, Any]:
+        """return schema from the stored file or a new one"""
+        with self._lock:
+            if self._schema is None:
+                self._schema = read_schema() or generate_schema()
+            return self._schema
+
+    def get_rendered(self, renderer) -> RenderedSchema:
+        """return schema rendered by renderer"""
+        rendered = self._rendered.get(renderer.media_type)
+        if rendered is None:
+            content = renderer.render(self.get_schema(), renderer.media_type)
+            rendered = RenderedSchema(
+                content=content,
+                gzipped=gzip.compress(content, mtime=0),
+                etag='"%s"' % hashlib.sha1(content).hexdigest())
+            self._rendered[renderer.media_type] = rendered
+        return rendered
+
+
+store = SchemaStore()
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """document the signed access tokens of core.authentication"""
+    target_class = 'core.authentication.SignedTokenAuthentication'
+    name = 'accessTokenAuth'
+
+    def get_security_definition(self, auto_schema):
+        return {
+            'type': 'http',
+            'scheme': 'bearer',
+            'description': 'Short lived access token from '
+                           '/api/user/token/access/',
+        }
@@ -0,0 +1,334 @@
+"""
+Synthetic data for reproducing production sized databases
+Rows are generated in chunks with explicit primary keys, so a chunk
+never reads back what another one wrote and chunks of a phase can be
+written by several processes at once. PostgreSQL gets COPY, other
+backends a batched executemany. The same seed always gives the same
+rows, whatever the number of processes.
+"""
+import csv
+import io
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+from functools import lru_cache
+from itertools import accumulate
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+
+from core.models import Ingredient, Recipe, Tag
+
+DEFAULTS = {
+    'users': 100,
+    'recipes': 10000,
+    'tags_per_user': 20,
+    'ingredients_per_user': 50,
+    # most relations of one recipe, the count is drawn from 1 to it
+    'tags_per_recipe': 3,
+    'ingredients_per_recipe': 8,
+    # zipf exponent of recipes per user and of tag and ingredient
+    # popularity, 0 is uniform
+    'skew': 1.0,
+    'batch_size': 5000,
+    'seed': 0,
+}
+
+PASSWORD = 'seedpass123'
+
+TAG_WORDS = (
+    'vegan', 'vegetarian', 'gluten free', 'dessert', 'breakfast', 'dinner',
+    'lunch', 'quick', 'spicy', 'italian', 'mexican', 'indian', 'thai',
+    'french', 'japanese', 'greek', 'soup', 'salad', 'baking', 'grill',
+    'budget', 'healthy', 'comfort food', 'party', 'kids', 'summer',
+    'winter', 'holiday', 'one pot', 'slow cooker',
+)
+INGREDIENT_WORDS = (
+    'salt', 'pepper', 'olive oil', 'butter', 'garlic', 'onion', 'tomato',
+    'flour', 'sugar', 'egg', 'milk', 'cream', 'cheese', 'rice', 'pasta',
+    'chicken', 'beef', 'pork', 'salmon', 'shrimp', 'tofu', 'lentils',
+    'chickpeas', 'potato', 'carrot', 'celery', 'spinach', 'kale', 'basil',
+    'parsley', 'cilantro', 'ginger', 'chili', 'lemon', 'lime', 'honey',
+    'soy sauce', 'vinegar', 'mustard', 'yogurt', 'mushroom', 'zucchini',
+    'bell pepper', 'cucumber', 'avocado', 'coconut milk', 'oats',
+    'almonds', 'walnuts', 'cinnamon',
+)
+ADJECTIVES = (
+    'easy', 'classic', 'crispy', 'creamy', 'smoky', 'roasted', 'spicy',
+    'grandma\'s', 'weeknight', 'rustic', 'zesty', 'golden', 'hearty',
+)
+DISHES = (
+    'soup', 'salad', 'stew', 'curry', 'pie', 'tacos', 'bowl', 'stir fry',
+    'risotto', 'casserole', 'pasta', 'burger', 'sandwich', 'bake',
+)
+
+
+class Ids(NamedTuple):
+    """first primary key of the seeded rows of every table"""
+    user: int
+    tag: int
+    ingredient: int
+    recipe: int
+
+
+class Chunk(NamedTuple):
+    """rows from start to stop of a phase, written by one task"""
+    phase: str
+    start: int
+    stop: int
+    options: dict
+    ids: Ids
+
+
+def item_name(words, index) -> str:
+    """return name of the index-th tag or ingredient of a user"""
+    name = words[index % len(words)]
+    rounds = index // len(words)
+    return f'{name} {rounds + 1}' if rounds else name
+
+
+@lru_cache(maxsize=None)
+def zipf_weights(size, skew) -> list[float]:
+    """return cumulative weights of ranks 1 to size"""
+    return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+def pick_distinct(rnd, size, count, skew) -> list[int]:
+    """return up to count distinct indexes below size, skewed to low ones"""
+    count = min(count, size)
+    if count <= 0:
+        return []
+    picked = dict.fromkeys(rnd.choices(
+        range(size), cum_weights=zipf_weights(size, skew), k=count * 2))
+    picked = list(picked)[:count]
+    # a strong skew can draw too few distinct ones, fill them up
+    for index in range(size):
+        if len(picked) == count:
+            break
+        if index not in picked:
+            picked.append(index)
+    return picked
+
+
+class TableWriter:
+    """
+    Batched inserts into the table of model.
+    Concrete fields missing from columns get their default,
+    a missing primary key is left to the database.
+    """
+
+    def __init__(self, model, columns, connection) -> None:
+        self.connection = connection
+        qn = connection.ops.quote_name
+        fields = [model._meta.get_field(name) for name in columns]
+        missing = [field for field in model._meta.concrete_fields
+                   if field not in fields and not field.primary_key]
+        self.defaults = tuple(field.get_default() for field in missing)
+        self.table = qn(model._meta.db_table)
+        self.columns = ', '.join(
+            qn(field.column) for field in fields + missing)
+        self.width = len(fields) + len(missing)
+
+    def write(self, rows: Iterable[tuple]) -> int:
+        """insert rows, return their number"""
+        rows = [row + self.defaults for row in rows]
+        if not rows:
+            return 0
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {self.table} ({self.columns}) '
+                    f'FROM STDIN WITH (FORMAT csv)', buffer)
+            else:
+                placeholders = ', '.join(['%s'] * self.width)
+                cursor.executemany(
+                    f'INSERT INTO {self.table} ({self.columns}) '
+                    f'VALUES ({placeholders})', rows)
+        return len(rows)
+
+
+def user_rows(chunk, rnd, password) -> Iterator[tuple]:
+    for index in range(chunk.start, chunk.stop):
+        pk = chunk.ids.user + index
+        yield (pk, f'user{pk}@seed.example.com', f'Seed User {pk}', password)
+
+
+def named_rows(chunk, words, first_id, per_user) -> Iterator[tuple]:
+    for index in range(chunk.start, chunk.stop):
+        user_id = chunk.ids.user + index
+        for number in range(per_user):
+            yield (first_id + index * per_user + number, user_id,
+                   item_name(words, number))
+
+
+def _relation_count(rnd, most) -> int:
+    return rnd.randint(min(1, most), most)
+
+
+def recipe_rows(chunk, rnd) -> tuple[list, list, list]:
+    """return recipe, recipe tag and recipe ingredient rows of chunk"""
+    options = chunk.options
+    skew = options['skew']
+    owners = rnd.choices(
+        range(options['users']),
+        cum_weights=zipf_weights(options['users'], skew),
+        k=chunk.stop - chunk.start)
+    recipes, tags, ingredients = [], [], []
+    for index, owner in zip(range(chunk.start, chunk.stop), owners):
+        pk = chunk.ids.recipe + index
+        ingredient_numbers = pick_distinct(
+            rnd, options['ingredients_per_user'],
+            _relation_count(rnd, options['ingredients_per_recipe']), skew)
+        main = INGREDIENT_WORDS[ingredient_numbers[0] % len(
+            INGREDIENT_WORDS)] if ingredient_numbers else 'house'
+        recipes.append((
+            pk, chunk.ids.user + owner,
+            f'{rnd.choice(ADJECTIVES)} {main} {rnd.choice(DISHES)}',
+            rnd.randint(5, 180),
+            Decimal(rnd.randint(100, 5000)) / 100,
+            ' '.join(rnd.choices(INGREDIENT_WORDS + DISHES, k=15)),
+            f'https://example.com/recipes/{pk}',
+        ))
+        for number in pick_distinct(
+                rnd, options['tags_per_user'],
+                _relation_count(rnd, options['tags_per_recipe']), skew):
+            tags.append((pk, chunk.ids.tag + owner *
+                         options['tags_per_user'] + number))
+        for number in ingredient_numbers:
+            ingredients.append((pk, chunk.ids.ingredient + owner *
+                                options['ingredients_per_user'] + number))
+    return recipes, tags, ingredients
+
+
+def write_chunk(chunk, password='') -> dict[str, int]:
+    """write rows of chunk, return rows written by table"""
+    connection = connections['default']
+    # a generator per chunk keeps rows independent of the process count
+    rnd = random.Random(f'{chunk.options["seed"]}:{chunk.phase}:'
+                        f'{chunk.start}')
+    options = chunk.options
+    written: dict[str, int] = {}
+    with transaction.atomic():
+        if chunk.phase == 'users':
+            written['users'] = TableWriter(
+                get_user_model(), ('id', 'email', 'name', 'password'),
+                connection).write(user_rows(chunk, rnd, password))
+        elif chunk.phase == 'names':
+            written['tags'] = TableWriter(
+                Tag, ('id', 'user', 'name'), connection).write(named_rows(
+                    chunk, TAG_WORDS, chunk.ids.tag, options['tags_per_user']))
+            written['ingredients'] = TableWriter(
+                Ingredient, ('id', 'user', 'name'), connection).write(
+                named_rows(chunk, INGREDIENT_WORDS, chunk.ids.ingredient,
+                           options['ingredients_per_user']))
+        else:
+            recipes, tags, ingredients = recipe_rows(chunk, rnd)
+            written['recipes'] = TableWriter(
+                Recipe, ('id', 'user', 'title', 'time_minutes', 'price',
+                         'description', 'link'), connection).write(recipes)
+            written['recipe tags'] = TableWriter(
+                Recipe.tags.through, ('recipe', 'tag'),
+                connection).write(tags)
+            written['recipe ingredients'] = TableWriter(
+                Recipe.ingredients.through, ('recipe', 'ingredient'),
+                connection).write(ingredients)
+    return written
+
+
+def _init_worker() -> None:
+    # spawned workers start without Django, forked ones have it ready
+    django.setup()
+
+
+def _write_chunk(args) -> dict[str, int]:
+    return write_chunk(*args)
+
+
+def next_ids() -> Ids:
+    """return first free primary key of every table"""
+    def first_free(model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    return Ids(first_free(get_user_model()), first_free(Tag),
+               first_free(Ingredient), first_free(Recipe))
+
+
+def supports_workers(connection) -> bool:
+    """whether several processes can write at once"""
+    return connection.vendor == 'postgresql'
+
+
+def seed(options=None, workers=1,
+         report: Optional[Callable[[str, dict, float], Any]] = None
+         ) -> dict[str, int]:
+    """
+    Write synthetic users, tags, ingredients and recipes,
+    return rows written by table.
+    """
+    options = {**DEFAULTS, **(options or {})}
+    connection = connections['default']
+    if not supports_workers(connection):
+        workers = 1
+    ids = next_ids()
+    # hashing is slow on purpose, every seeded user shares the hash
+    password = make_password(PASSWORD)
+    batch = options['batch_size']
+    per_user = max(
+        1, batch // max(options['tags_per_user'] +
+                        options['ingredients_per_user'], 1))
+    phases = (
+        ('users', options['users'], batch),
+        ('names', options['users'], per_user),
+        # a recipe comes with about ten relation rows
+        ('recipes', options['recipes'] if options['users'] else 0,
+         max(1, batch // 10)),
+    )
+    pool = None
+    if workers > 1:
+        # forked workers must not share the connection of this process
+        connections.close_all()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+    totals: dict[str, int] = {}
+    try:
+        for phase, size, step in phases:
+            started = time.perf_counter()
+            chunks = [(Chunk(phase, start, min(start + step, size),
+                             options, ids), password)
+                      for start in range(0, size, step)]
+            results = pool.imap_unordered(_write_chunk, chunks) if pool \
+                else map(_write_chunk, chunks)
+            written: dict[str, int] = {}
+            for result in results:
+                for table, count in result.items():
+                    written[table] = written.get(table, 0) + count
+            for table, count in written.items():
+                totals[table] = totals.get(table, 0) + count
+            if report:
+                report(phase, written, time.perf_counter() - started)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    reset_sequences(connection)
+    # relation rows were written without m2m_changed signals
+    for model in (Tag, Ingredient):
+        model.objects.filter(user_id__gte=ids.user).recount()
+    return totals
+
+
+def reset_sequences(connection) -> None:
+    """move sequences past the explicit primary keys written"""
+    models = [get_user_model(), Tag, Ingredient, Recipe]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
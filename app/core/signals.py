@@ -0,0 +1,31 @@
+"""
+Signal receivers of core models
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_token, invalidate_user_tokens
+from core.metrics import install_query_wrapper
+
+
+@receiver(post_delete, sender=Token)
+def drop_deleted_token(sender, instance, **kwargs):
+    """forget a deleted token"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def drop_changed_user_tokens(sender, instance, created, **kwargs):
+    """forget tokens of a changed or deactivated user"""
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(connection_created)
+def measure_queries(sender, connection, **kwargs):
+    """count the queries of every connection in the request metrics"""
+    install_query_wrapper(connection)
@@ -0,0 +1,210 @@
+"""tests for cached token and signed access token authentication"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    LRUCache,
+    TokenCache,
+    get_token_cache,
+    issue_access_token, )
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ME_URL = reverse('user:me')
+
+
+class LRUCacheTests(TestCase):
+    """tests for the in-process token cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the cache keeps at most max_size entries."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    @patch('core.authentication.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        """Test entries are dropped after ttl seconds."""
+        cache = LRUCache(max_size=2, ttl=30)
+        patched_monotonic.return_value = 100
+        cache.set('a', 1)
+
+        patched_monotonic.return_value = 129
+        self.assertEqual(cache.get('a'), 1)
+        patched_monotonic.return_value = 131
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """tests for authentication with cached tokens"""
+
+    def setUp(self):
+        get_token_cache().local.clear()
+        self.user = get_user_model().objects.create_user(
+            'auth@example.com', 'testpass123', name='auth user')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_second_request_skips_token_query(self):
+        """Test a cached token is authenticated without a query."""
+        self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_is_rejected(self):
+        """Test a deleted token stops working at once."""
+        self.client.get(RECIPES_URL)
+        self.token.delete()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test a deactivated user is rejected at once."""
+        self.client.get(RECIPES_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_refreshes_cached_user(self):
+        """Test changes made through the me endpoint are seen."""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {'name': 'new name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+    def test_shared_cache_tier(self):
+        """Test a token cached by another worker is read from shared tier."""
+        caches = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'shared-token-tests'},
+        }
+        options = {'MAX_SIZE': 10, 'TTL': 30, 'SHARED_CACHE': 'shared'}
+        with override_settings(CACHES=caches, TOKEN_AUTH_CACHE=options):
+            self.client.get(RECIPES_URL)
+            get_token_cache().local.clear()
+
+            with self.assertNumQueries(1):
+                res = self.client.get(RECIPES_URL)
+            user, token = get_token_cache().shared.get(
+                TokenCache.shared_key(self.token.key))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((user.pk, user.is_active), (self.user.pk, True))
+        self.assertEqual(user.password, '')
+        self.assertEqual(user.email, '')
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(token.user.password, '')
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    """tests for authentication with signed access tokens"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'signed@example.com', 'testpass123', name='signed user')
+        self.access, _ = issue_access_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_get_makes_no_auth_query(self):
+        """Test the first request is authenticated without a query."""
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_writes_use_token_user(self):
+        """Test rows written with an access token belong to its user."""
+        res = self.client.post(RECIPES_URL, {
+            'title': 'soup', 'time_minutes': 5, 'price': '1.00',
+            'tags': [{'name': 'hot'}]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.user.recipe_set.get().tags.get().user,
+                         self.user)
+
+    def test_me_loads_user(self):
+        """Test the me endpoint reads and saves the stored user."""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], 'signed@example.com')
+        res = self.client.patch(ME_URL, {'name': 'new name'})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'new name')
+        self.assertEqual(self.user.email, 'signed@example.com')
+
+    def test_me_rejects_deactivated_user(self):
+        """Test the me endpoint checks the stored user."""
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_write_of_deleted_user_is_rejected(self):
+        """Test a write after the user was deleted gives 401."""
+        self.user.delete()
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'soup', 'time_minutes': 5, 'price': '1.00'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @patch('core.authentication.time.time')
+    def test_expired_token_is_rejected(self, patched_time):
+        """Test a token stops working after its lifetime."""
+        patched_time.return_value = 1000
+        access, ttl = issue_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        patched_time.return_value = 1000 + ttl - 1
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+        patched_time.return_value = 1000 + ttl + 1
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+    def test_tampered_token_is_rejected(self):
+        """Test a token with a changed user id is rejected."""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        forged = issue_access_token(other)[0].split(':')[0] + ':' + \
+            self.access.split(':', 1)[1]
+
+        for token in (forged, 'garbage', f'{self.access} extra'):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+            res = self.client.get(RECIPES_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,13 +1,21 @@
 """
 Test custom Django management commands.
 """
+from io import StringIO
+from unittest import skipIf, skipUnless
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core import seeding
+from core.models import Ingredient, Recipe, Tag
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +40,79 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class SeedDataTests(TestCase):
+    """Test the seed_data command."""
+
+    options = {'users': 3, 'recipes': 40, 'tags_per_user': 4,
+               'ingredients_per_user': 6, 'batch_size': 100}
+
+    def test_seed_data(self):
+        """Test synthetic rows are written with consistent relations."""
+        out = StringIO()
+
+        # several workers write outside the transaction of the test
+        call_command('seed_data', workers=1, stdout=out, **self.options)
+
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertEqual(Tag.objects.count(), 12)
+        self.assertEqual(Ingredient.objects.count(), 18)
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertFalse(Recipe.objects.exclude(
+            tags__user=F('user')).exclude(tags=None).exists())
+        self.assertFalse(Recipe.objects.exclude(
+            ingredients__user=F('user')).exists())
+        self.assertFalse(Recipe.objects.exclude(
+            image_status=Recipe.ImageStatus.NONE).exists())
+        self.assertEqual(
+            sum(Tag.objects.values_list('recipe_count', flat=True)),
+            Recipe.tags.through.objects.count())
+        user = get_user_model().objects.first()
+        self.assertTrue(user.check_password(seeding.PASSWORD))
+        # primary keys continue after the seeded ones
+        Recipe.objects.create(user=user, title='new', price=1)
+
+    @skipIf(connection.vendor == 'postgresql', 'allows several writers')
+    @patch('core.seeding.seed', return_value={})
+    def test_one_writer(self, patched_seed):
+        """Test workers fall back to one process on other databases."""
+        out = StringIO()
+
+        call_command('seed_data', workers=4, stdout=out, **self.options)
+
+        self.assertIn('one process', out.getvalue())
+        self.assertEqual(patched_seed.call_args.args[1], 1)
+
+    def test_same_seed_same_rows(self):
+        """Test a seed always generates the same recipes."""
+        def recipes(first_user):
+            return [(title, price, user_id - first_user)
+                    for title, price, user_id in Recipe.objects.filter(
+                        user_id__gte=first_user).order_by('id').values_list(
+                        'title', 'price', 'user_id')]
+
+        first = seeding.next_ids().user
+        seeding.seed(self.options)
+        second = seeding.next_ids().user
+        seeding.seed(self.options)
+
+        self.assertEqual(recipes(second), recipes(first)[:40])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs several writers')
+class SeedDataWorkersTests(TransactionTestCase):
+    """Test the seed_data command writing from several processes."""
+
+    def test_seed_data_workers(self):
+        """Test rows written by worker processes are all there."""
+        call_command('seed_data', workers=2, stdout=StringIO(),
+                     **SeedDataTests.options)
+
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertEqual(Tag.objects.count(), 12)
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertEqual(
+            sum(Tag.objects.values_list('recipe_count', flat=True)),
+            Recipe.tags.through.objects.count())
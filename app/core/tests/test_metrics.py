@@ -0,0 +1,197 @@
+"""
+Tests for the request metrics
+"""
+import asyncio
+import re
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, \
+    override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.middleware import RequestMetricsMiddleware
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+def parse_server_timing(value) -> dict[str, dict[str, str]]:
+    """return Server-Timing entries by name"""
+    entries = {}
+    for entry in value.split(','):
+        name, *params = entry.strip().split(';')
+        entries[name] = dict(param.split('=', 1) for param in params)
+    return entries
+
+
+def sample(text, line) -> float:
+    """return value of the exposition line starting with line"""
+    match = re.search('^' + re.escape(line) + r' (\S+)$', text, re.M)
+    return float(match.group(1)) if match else None
+
+
+class HistogramTests(SimpleTestCase):
+    """Tests for Histogram."""
+
+    def test_buckets_are_cumulative(self):
+        """Test series are exported with cumulative buckets."""
+        histogram = metrics.Histogram('test_seconds', 'Test.', (1, 5))
+
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value, 'View', 'list')
+        text = '\n'.join(histogram.collect())
+
+        labels = 'view="View",action="list"'
+        bucket = 'test_seconds_bucket{' + labels + ',le="%s"}'
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertEqual(sample(text, bucket % 1), 2)
+        self.assertEqual(sample(text, bucket % 5), 3)
+        self.assertEqual(sample(text, bucket % '+Inf'), 4)
+        self.assertEqual(sample(text, f'test_seconds_sum{{{labels}}}'), 14.5)
+        self.assertEqual(sample(text, f'test_seconds_count{{{labels}}}'), 4)
+
+    def test_label_values_are_escaped(self):
+        """Test quotes in label values do not break the format."""
+        histogram = metrics.Histogram('test_bytes', 'Test.', (1,))
+
+        histogram.observe(2, 'a"b', 'list')
+
+        self.assertIn(
+            'test_bytes_count{view="a\\"b",action="list"} 1',
+            list(histogram.collect()))
+
+
+METRICS = {'ENABLED': True, 'SERVER_TIMING': True, 'EXPORT': True,
+           'EXPORT_TOKEN': 'scrape-token'}
+
+
+@override_settings(REQUEST_METRICS=METRICS)
+class RequestMetricsTests(TestCase):
+    """Tests for RequestMetricsMiddleware."""
+
+    def setUp(self):
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'metrics@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='soup', price=Decimal('2.00'))
+        recipe.tags.add(Tag.objects.create(user=self.user, name='hot'))
+
+    def test_server_timing(self):
+        """Test the measures of a request are sent in Server-Timing."""
+        res = self.client.get(RECIPES_URL)
+
+        timing = parse_server_timing(res['Server-Timing'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+        self.assertRegex(timing['db']['desc'], r'^"[1-9]\d* queries"$')
+        self.assertGreater(float(timing['serialize']['dur']), 0)
+        self.assertGreater(float(timing['render']['dur']), 0)
+        self.assertGreaterEqual(
+            float(timing['total']['dur']), float(timing['db']['dur']))
+
+    def test_metrics_are_aggregated_by_view_and_action(self):
+        """Test /metrics exports histograms of the served requests."""
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL)
+        queries = int(parse_server_timing(
+            res['Server-Timing'])['db']['desc'].strip('"').split()[0])
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-token')
+
+        text = res.content.decode()
+        labels = '{view="RecipeViewSet",action="list"}'
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertEqual(
+            sample(text, f'http_request_duration_seconds_count{labels}'), 2)
+        self.assertEqual(
+            sample(text, f'http_request_queries_sum{labels}'), 2 * queries)
+        self.assertEqual(
+            sample(text, f'http_response_size_bytes_count{labels}'), 2)
+        self.assertIn('token_cache_entries ', text)
+        self.assertIn('recipe_response_cache_hits_total ', text)
+
+    def test_fast_list_is_measured(self):
+        """Test the serializer free list records its shaping time."""
+        with override_settings(RECIPE_FAST_LIST=True):
+            res = self.client.get(RECIPES_URL)
+
+        timing = parse_server_timing(res['Server-Timing'])
+        self.assertGreater(float(timing['serialize']['dur']), 0)
+
+    @override_settings(REQUEST_METRICS={**METRICS, 'ENABLED': False})
+    def test_disabled(self):
+        """Test nothing is measured when disabled."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertFalse(res.has_header('Server-Timing'))
+        self.assertNotIn('RecipeViewSet', self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-token',
+        ).content.decode())
+
+    @override_settings(REQUEST_METRICS={})
+    def test_nothing_exposed_by_default(self):
+        """Test measures are neither sent to clients nor served."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertFalse(res.has_header('Server-Timing'))
+        self.assertEqual(self.client.get(METRICS_URL).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_export_needs_token_or_staff(self):
+        """Test /metrics is only served to scrapers and staff."""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+                        {'HTTP_AUTHORIZATION': 'Bearer'}):
+            res = self.client.get(METRICS_URL, **headers)
+
+            self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(METRICS_URL).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        staff = get_user_model().objects.create_superuser(
+            'staff@example.com', 'testpass123')
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(METRICS_URL).status_code,
+                         status.HTTP_200_OK)
+
+    async def test_asgi_request_is_measured(self):
+        """Test queries run in the view thread are counted under ASGI."""
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+
+        res = await self.async_client.get(
+            RECIPES_URL, AUTHORIZATION=f'Token {token.key}')
+
+        timing = parse_server_timing(res['Server-Timing'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(timing['db']['desc'], '"0 queries"')
+
+    def test_async_middleware(self):
+        """Test the middleware runs on the event loop in async mode."""
+        async def get_response(request):
+            return HttpResponse(b'body')
+
+        middleware = RequestMetricsMiddleware(get_response)
+        request = RequestFactory().get('/nowhere/')
+
+        res = async_to_sync(middleware)(request)
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertIn('total;dur=', res['Server-Timing'])
+        self.assertIn(
+            'http_response_size_bytes_sum{view="unresolved",action=""} 4',
+            metrics.export())
@@ -0,0 +1,50 @@
+"""tests for data migrations"""
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateNamesTests(TransactionTestCase):
+    """tests for merging tags and ingredients before they are unique"""
+
+    before = [('core', '0010_recipe_search')]
+    after = [('core', '0011_hot_path_indexes')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        """Test recipes of duplicates are linked to the oldest one."""
+        apps = self.migrate(self.before)
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        user = User.objects.create(email='merge@example.com')
+        other = User.objects.create(email='other@example.com')
+        keep, first, second = (
+            Tag.objects.create(user=user, name='Vegan') for _ in range(3))
+        unrelated = Tag.objects.create(user=other, name='Vegan')
+        both = Recipe.objects.create(
+            user=user, title='both', time_minutes=1, price=1)
+        both.tags.add(keep, first)
+        single = Recipe.objects.create(
+            user=user, title='single', time_minutes=1, price=1)
+        single.tags.add(second)
+
+        apps = self.migrate(self.after)
+
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+        self.assertEqual(
+            sorted(Tag.objects.values_list('id', flat=True)),
+            [keep.id, unrelated.id])
+        for recipe in (both, single):
+            self.assertEqual(
+                list(Recipe.objects.get(id=recipe.id).tags.values_list(
+                    'id', flat=True)), [keep.id])
@@ -1,6 +1,7 @@
 """tests for models"""
 
 from unittest.mock import patch
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -93,3 +94,60 @@ class ModelTests(TestCase):
         mock_uuid.return_value = uuid
         file_path = models.recipe_image_file_path(None, 'example.jpg')
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+class IndexTests(TestCase):
+    """Tests for the indexes used by hot queries."""
+
+    def setUp(self):
+        self.user = create_user()
+        if connection.vendor == 'postgresql':
+            # tiny test tables are cheaper to scan than to read by index
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, name):
+        """check the query plan of queryset reads index name"""
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # sqlite names indexes of unique constraints itself
+            constraints = {
+                constraint.name for constraint in
+                queryset.model._meta.constraints}
+            if name in constraints:
+                name = f'sqlite_autoindex_{queryset.model._meta.db_table}_'
+        self.assertIn(name, plan)
+
+    def test_recipe_list_uses_user_index(self):
+        """Test recipes of a user are read newest first by index."""
+        queryset = models.Recipe.objects.filter(
+            user=self.user, id__lt=100).order_by('-id')[:101]
+
+        self.assertUsesIndex(queryset, 'recipe_user_newest_idx')
+
+    def test_name_lookups_use_unique_index(self):
+        """Test tags and ingredients are found by name through the index."""
+        for model, name in ((models.Tag, 'unique_tag_name_per_user'),
+                            (models.Ingredient,
+                             'unique_ingredient_name_per_user')):
+            queryset = model.objects.filter(
+                user=self.user, name__in=['Salt', 'Pepper'])
+
+            self.assertUsesIndex(queryset, name)
+
+    def test_tag_list_uses_unique_index(self):
+        """Test tags of a user are read in name order by index."""
+        queryset = models.Tag.objects.filter(
+            user=self.user).order_by('-name', '-id')[:101]
+
+        self.assertUsesIndex(queryset, 'unique_tag_name_per_user')
+
+    def test_names_are_unique_per_user(self):
+        """Test a user can not have two tags or ingredients of one name."""
+        other = create_user(email='other@example.com')
+        for model in (models.Tag, models.Ingredient):
+            model.objects.create(user=self.user, name='Vegan')
+            model.objects.create(user=other, name='Vegan')
+
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                model.objects.create(user=self.user, name='Vegan')
@@ -0,0 +1,133 @@
+"""
+Tests for the database connection pool
+"""
+import threading
+
+from django.db.utils import load_backend
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """connection that only knows whether it is open"""
+
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Tests for ConnectionPool."""
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_released_connection_is_reused(self):
+        """Test a released connection is handed out again."""
+        pool = ConnectionPool(max_size=2)
+
+        first = pool.acquire(self.connect)
+        pool.release(first)
+        second = pool.acquire(self.connect)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_checkout_times_out_when_full(self):
+        """Test a checkout fails after waiting when all are in use."""
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.acquire(self.connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_waiting_checkout_gets_released_connection(self):
+        """Test a waiting thread gets the connection released by another."""
+        pool = ConnectionPool(max_size=1, timeout=5)
+        conn = pool.acquire(self.connect)
+        result = []
+        waiter = threading.Thread(
+            target=lambda: result.append(pool.acquire(self.connect)))
+
+        waiter.start()
+        while pool.stats()['waits'] == 0:
+            pass
+        pool.release(conn)
+        waiter.join()
+
+        self.assertEqual(result, [conn])
+        self.assertEqual(len(self.opened), 1)
+
+    def test_idle_connections_expire(self):
+        """Test connections idle longer than the timeout are closed."""
+        pool = ConnectionPool(max_size=1, idle_timeout=0)
+        old = pool.acquire(self.connect)
+        pool.release(old)
+
+        new = pool.acquire(self.connect)
+
+        self.assertTrue(old.closed)
+        self.assertIsNot(new, old)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        """Test a connection failing the health check is not handed out."""
+        pool = ConnectionPool(max_size=1, check=lambda conn: False)
+        broken = pool.acquire(self.connect)
+        pool.release(broken)
+
+        conn = pool.acquire(self.connect)
+
+        self.assertIsNot(conn, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_discarded_and_failed_connections_free_their_slot(self):
+        """Test discarded connections and connect errors free the slot."""
+        pool = ConnectionPool(max_size=1, timeout=0)
+        conn = pool.acquire(self.connect)
+        pool.release(conn, discard=True)
+
+        def fail():
+            raise OSError('refused')
+
+        with self.assertRaises(OSError):
+            pool.acquire(fail)
+        pool.acquire(self.connect)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_close_idle(self):
+        """Test closing idle connections keeps the ones in use."""
+        pool = ConnectionPool(max_size=2)
+        in_use = pool.acquire(self.connect)
+        idle = pool.acquire(self.connect)
+        pool.release(idle)
+
+        pool.close_idle()
+
+        self.assertTrue(idle.closed)
+        self.assertFalse(in_use.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_pooled_backend_loads(self):
+        """Test the pooled engine is a valid database backend."""
+        backend = load_backend('core.db.pooled')
+
+        self.assertTrue(hasattr(backend, 'DatabaseWrapper'))
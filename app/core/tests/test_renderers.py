@@ -0,0 +1,131 @@
+"""
+Tests for renderers and parsers
+"""
+import io
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+if msgpack is not None:
+    from core.parsers import MessagePackParser
+    from core.renderers import MessagePackRenderer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class ORJSONRendererTests(TestCase):
+    """Tests for the orjson renderer."""
+
+    def test_output_matches_json_renderer(self):
+        """Test orjson output is the one of the DRF renderer."""
+        data = {
+            'price': Decimal('5.50'),
+            'created': datetime(2022, 5, 1, 10, 2, 3, 123456,
+                                tzinfo=timezone.utc),
+            'offset': datetime(2022, 5, 1, 10, 2, 3,
+                               tzinfo=timezone(timedelta(hours=2))),
+            'naive': datetime(2022, 5, 1, 10, 2, 3, 5),
+            'day': date(2022, 5, 1),
+            'duration': timedelta(minutes=90),
+            'uuid': UUID('12345678-1234-5678-1234-567812345678'),
+            'text': 'żurek \u2028\u2029 "quoted"',
+            'nested': [{1: None, 'flag': True}, 1.5, 2 ** 70],
+        }
+
+        expected = JSONRenderer().render(data)
+
+        self.assertEqual(ORJSONRenderer().render(data), expected)
+
+    def test_indent_is_kept(self):
+        """Test an indent in the accepted media type is honoured."""
+        data = {'a': [1, 2]}
+        media_type = 'application/json; indent=4'
+
+        res = ORJSONRenderer().render(data, media_type)
+
+        self.assertEqual(res, JSONRenderer().render(data, media_type))
+
+    def test_parser_round_trip(self):
+        """Test orjson parser reads what the renderer wrote."""
+        data = {'title': 'soup', 'tags': [{'name': 'ąę'}]}
+        body = io.BytesIO(ORJSONRenderer().render(data))
+
+        self.assertEqual(ORJSONParser().parse(body), data)
+
+    def test_parser_invalid_json(self):
+        """Test invalid JSON raises a parse error."""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MessagePackTests(TestCase):
+    """Tests for MessagePack content negotiation."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='pack@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_as_msgpack(self):
+        """Test recipes are rendered as MessagePack when accepted."""
+        Recipe.objects.create(
+            user=self.user, title='soup', time_minutes=5,
+            price=Decimal('5.50'))
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        data = msgpack.unpackb(res.content)
+        self.assertEqual(data[0]['price'], '5.50')
+        self.assertEqual(data[0]['title'], 'soup')
+
+    def test_create_from_msgpack(self):
+        """Test a recipe can be posted as MessagePack."""
+        payload = {'title': 'stew', 'time_minutes': 30, 'price': '3.20',
+                   'tags': [{'name': 'Dinner'}]}
+
+        res = self.client.post(
+            RECIPES_URL, msgpack.packb(payload),
+            content_type='application/msgpack')
+
+        self.assertEqual(res.status_code, 201)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.price, Decimal('3.20'))
+        self.assertEqual(recipe.tags.get().name, 'Dinner')
+
+    def test_renderer_matches_json_values(self):
+        """Test decimals and datetimes are converted like in JSON."""
+        created = datetime(2022, 5, 1, 10, 2, 3, 123456, tzinfo=timezone.utc)
+        data = {'price': Decimal('5.5'), 'created': created}
+
+        res = msgpack.unpackb(MessagePackRenderer().render(data))
+
+        self.assertEqual(res, {'price': 5.5,
+                               'created': '2022-05-01T10:02:03.123456Z'})
+
+    def test_parser_invalid_body(self):
+        """Test an invalid body raises a parse error."""
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
@@ -0,0 +1,92 @@
+"""
+Tests for the precomputed OpenAPI schema
+"""
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+
+from core import schema
+from core.schema import store
+
+SCHEMA_URL = reverse('api_schema')
+
+
+class SchemaViewTests(SimpleTestCase):
+    """Tests for the cached schema view."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.schema_file = Path(tmp.name) / 'schema.json'
+        settings = override_settings(OPENAPI_SCHEMA_FILE=self.schema_file)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        store.clear()
+        self.addCleanup(store.clear)
+
+    def test_schema_has_etag_and_is_not_modified(self):
+        """Test the schema carries an ETag that yields a 304."""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b'/api/recipe/recipes/', res.content)
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_gzipped_schema(self):
+        """Test clients accepting gzip get the compressed schema."""
+        plain = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+
+    def test_json_schema(self):
+        """Test the schema is rendered in the accepted format."""
+        res = self.client.get(
+            SCHEMA_URL, HTTP_ACCEPT='application/vnd.oai.openapi+json')
+
+        self.assertTrue(
+            res['Content-Type'].startswith('application/vnd.oai.openapi+json'))
+        self.assertIn('/api/recipe/recipes/', json.loads(res.content)['paths'])
+
+    def test_built_schema_is_served_without_generating(self):
+        """Test a schema written by build_schema is used as is."""
+        out = StringIO()
+        call_command('build_schema', stdout=out)
+
+        with patch.object(schema, 'generate_schema') as generate:
+            res = self.client.get(SCHEMA_URL)
+
+        generate.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.schema_file.exists())
+
+        call_command('build_schema', stdout=out)
+
+        self.assertIn('up to date', out.getvalue())
+
+    def test_schema_of_other_code_version_is_regenerated(self):
+        """Test a schema built from other code is not served."""
+        self.schema_file.write_text(json.dumps(
+            {'version': 'old', 'schema': {'openapi': 'stale'}}))
+
+        res = self.client.get(
+            SCHEMA_URL, HTTP_ACCEPT='application/vnd.oai.openapi+json')
+
+        self.assertNotEqual(json.loads(res.content)['openapi'], 'stale')
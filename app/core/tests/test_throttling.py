@@ -0,0 +1,219 @@
+"""tests for token bucket throttling"""
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core.throttling import (
+    TAKE_SCRIPT,
+    LocalBuckets,
+    RedisBuckets,
+    get_store,
+    parse_rate, )
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+RATES = {'user': '3/min', 'anon': '2/min', 'create': '1/min',
+         'upload': '1/min', 'token': '2/min'}
+
+
+class LocalBucketsTests(SimpleTestCase):
+    """tests for buckets kept in the process"""
+
+    def test_parse_rate(self):
+        """Test rates give a capacity and tokens per second."""
+        self.assertEqual(parse_rate('10/min'), (10, 10 / 60))
+        self.assertEqual(parse_rate('2/s'), (2, 2))
+
+    @patch('core.throttling.time.monotonic')
+    def test_refill_and_wait(self, patched_monotonic):
+        """Test an empty bucket refills at its rate."""
+        buckets = LocalBuckets(max_size=10)
+        bucket = [('a', 2, 1.0)]
+        patched_monotonic.return_value = 100
+
+        self.assertEqual(buckets.take(bucket), 0)
+        self.assertEqual(buckets.take(bucket), 0)
+        self.assertEqual(buckets.take(bucket), 1)
+        patched_monotonic.return_value = 100.5
+        self.assertEqual(buckets.take(bucket), 0.5)
+        patched_monotonic.return_value = 101
+        self.assertEqual(buckets.take(bucket), 0)
+
+    def test_takes_from_all_buckets_or_none(self):
+        """Test a denied request leaves the other buckets untouched."""
+        buckets = LocalBuckets(max_size=10)
+        buckets.take([('scope', 1, 0.01)])
+
+        self.assertGreater(
+            buckets.take([('user', 2, 0.01), ('scope', 1, 0.01)]), 0)
+        self.assertEqual(buckets.take([('user', 2, 0.01)]), 0)
+        self.assertEqual(buckets.take([('user', 2, 0.01)]), 0)
+
+
+class FakeScript:
+    """registered script of FakeRedis, answers with a queued reply"""
+
+    def __init__(self, client, source) -> None:
+        self.client = client
+        self.source = source
+
+    def __call__(self, keys, args):
+        self.client.calls.append((self.source, keys, args))
+        return self.client.replies.pop(0)
+
+
+class FakeRedis:
+    """client of a Redis cache recording script calls"""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.replies = []
+
+    def get_client(self, write=False):
+        return self
+
+    def register_script(self, source):
+        return FakeScript(self, source)
+
+
+class RedisBucketsTests(SimpleTestCase):
+    """tests for buckets in a shared Redis cache"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.cache = Mock(_cache=self.redis)
+        self.cache.make_key.side_effect = lambda key: f':1:{key}'
+
+    def test_take_in_one_script_call(self):
+        """Test all buckets go to the script with their rates."""
+        self.redis.replies = [b'0', b'2.5']
+        buckets = RedisBuckets(self.cache)
+
+        self.assertEqual(buckets.take([('a', 10, 0.5), ('b', 2, 1.0)]), 0)
+        self.assertEqual(buckets.take([('a', 10, 0.5)]), 2.5)
+        source, keys, args = self.redis.calls[0]
+        self.assertEqual(source, TAKE_SCRIPT)
+        self.assertEqual(keys, [':1:a', ':1:b'])
+        self.assertEqual(args, [10, 0.5, 2, 1.0])
+        self.assertEqual(len(self.redis.calls), 2)
+
+    def test_requires_redis_cache(self):
+        """Test a cache without a Redis client is refused."""
+        with self.assertRaises(ImproperlyConfigured):
+            RedisBuckets(object())
+
+
+@override_settings(
+    API_THROTTLE={'ENABLED': True, 'SHARED_CACHE': None},
+    REST_FRAMEWORK={**api_settings.user_settings,
+                    'DEFAULT_THROTTLE_RATES': RATES})
+class ThrottleAPITests(TestCase):
+    """tests for throttled API requests"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'throttle@example.com', 'testpass123')
+
+    def test_user_bucket(self):
+        """Test users are limited with a Retry-After header."""
+        self.client.force_authenticate(self.user)
+        for _ in range(3):
+            self.assertEqual(
+                self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '20')
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_create_bucket(self):
+        """Test creates have their own smaller bucket."""
+        self.client.force_authenticate(self.user)
+        payload = {'title': 'soup', 'time_minutes': 5, 'price': '1.00'}
+        self.assertEqual(
+            self.client.post(RECIPES_URL, payload).status_code,
+            status.HTTP_201_CREATED)
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '60')
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_token_bucket_by_ip(self):
+        """Test password checks are limited per client IP."""
+        payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            res = self.client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = self.client.post(
+            TOKEN_URL, payload, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_spoofed_forwarded_for_shares_bucket(self):
+        """Test clients can not get new buckets from X-Forwarded-For."""
+        payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+        for num_proxies in (None, 0):
+            with override_settings(REST_FRAMEWORK={
+                    **api_settings.user_settings,
+                    'DEFAULT_THROTTLE_RATES': RATES,
+                    'NUM_PROXIES': num_proxies}):
+                statuses = [self.client.post(
+                    TOKEN_URL, payload, HTTP_X_FORWARDED_FOR=f'10.1.0.{i}',
+                ).status_code for i in range(3)]
+
+            self.assertEqual(statuses[-1],
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_behind_proxy(self):
+        """Test the address added by a trusted proxy is the client."""
+        payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+        with override_settings(REST_FRAMEWORK={
+                **api_settings.user_settings,
+                'DEFAULT_THROTTLE_RATES': RATES, 'NUM_PROXIES': 1}):
+            for i in range(3):
+                res = self.client.post(
+                    TOKEN_URL, payload,
+                    HTTP_X_FORWARDED_FOR=f'10.1.0.{i}, 10.2.0.1')
+            other = self.client.post(
+                TOKEN_URL, payload, HTTP_X_FORWARDED_FOR='10.1.0.1, 10.2.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(API_THROTTLE={})
+    def test_on_without_shared_cache(self):
+        """Test password checks are limited with buckets per worker."""
+        payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+        statuses = [self.client.post(TOKEN_URL, payload).status_code
+                    for _ in range(3)]
+
+        self.assertIsInstance(get_store(), LocalBuckets)
+        self.assertEqual(statuses[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(API_THROTTLE={'ENABLED': False})
+    def test_disabled(self):
+        """Test nothing is limited when throttling is off."""
+        for _ in range(5):
+            res = self.client.post(TOKEN_URL, {})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
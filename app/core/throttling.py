@@ -0,0 +1,212 @@
+"""
+Token bucket throttling shared by the API apps
+Every request takes a token from the bucket of its user, or of its
+client IP when anonymous, and from the bucket of its scope when the
+view gives one, e.g. creates, image uploads or password checks. All
+buckets of a request are checked and taken at once, in one Lua script
+call on the shared Redis cache so limits hold across workers.
+"""
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core.authentication import LRUCache
+
+DEFAULTS = {
+    'ENABLED': True,
+    # alias from CACHES of a Redis cache shared by all workers,
+    # None keeps buckets in the process
+    'SHARED_CACHE': None,
+    # number of buckets kept in the process without a shared cache
+    'MAX_SIZE': 10000,
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS are buckets, ARGV their capacity and refill rate per second.
+# Tokens are taken from every bucket or, when one is empty, from none,
+# and the seconds until all of them have a token again are returned.
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+
+def get_options() -> dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, 'API_THROTTLE', {})}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate) -> tuple[int, float]:
+    """
+    Return capacity and refill rate per second of a rate like 10/min,
+    the bucket holds the whole rate so it allows bursts of that size.
+    """
+    number, period = rate.split('/')
+    capacity = int(number)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocalBuckets:
+    """buckets of this process, limits are per worker"""
+
+    def __init__(self, max_size) -> None:
+        # an expired bucket would be full again, so it is just dropped
+        ttl = max((capacity / per_second for capacity, per_second in (
+            parse_rate(rate) for rate in
+            api_settings.DEFAULT_THROTTLE_RATES.values() if rate)),
+            default=0)
+        self.buckets = LRUCache(max_size, ttl + 1)
+        self._lock = threading.Lock()
+
+    def take(self, buckets) -> float:
+        """
+        Take a token of every bucket of (key, capacity, rate) when none
+        is empty, return 0 or the seconds to wait.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, capacity, rate in buckets:
+                tokens, ts = self.buckets.get(key) or (capacity, now)
+                tokens = min(capacity, tokens + (now - ts) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                levels.append(tokens)
+            for (key, _, _), tokens in zip(buckets, levels):
+                self.buckets.set(key, (tokens if wait else tokens - 1, now))
+        return wait
+
+
+class RedisBuckets:
+    """buckets in a Redis cache, taken atomically in one round trip"""
+
+    def __init__(self, cache) -> None:
+        if not hasattr(cache, '_cache') or \
+                not hasattr(cache._cache, 'get_client'):
+            raise ImproperlyConfigured(
+                'API_THROTTLE SHARED_CACHE must be a RedisCache')
+        self.cache = cache
+
+    def take(self, buckets) -> float:
+        client = self.cache._cache.get_client(write=True)
+        # EVALSHA, the script is only sent when Redis does not know it
+        script = client.register_script(TAKE_SCRIPT)
+        args: list[Any] = []
+        for _, capacity, rate in buckets:
+            args.extend((capacity, rate))
+        return float(script(
+            keys=[self.cache.make_key(key) for key, _, _ in buckets],
+            args=args))
+
+
+_store: Optional[Any] = None
+
+
+def get_store() -> Any:
+    """return the process wide bucket store"""
+    global _store
+    if _store is None:
+        options = get_options()
+        alias = options['SHARED_CACHE']
+        _store = RedisBuckets(caches[alias]) if alias \
+            else LocalBuckets(options['MAX_SIZE'])
+    return _store
+
+
+def _reset_store(*, setting, **kwargs) -> None:
+    """rebuild bucket store when its settings change"""
+    global _store
+    if setting in ('API_THROTTLE', 'CACHES', 'REST_FRAMEWORK'):
+        _store = None
+
+
+setting_changed.connect(_reset_store)
+
+
+def get_scope(view) -> Optional[str]:
+    """
+    Return the bucket of the action of view from its throttle_scopes,
+    or its throttle_scope, None when it has none.
+    """
+    scopes = getattr(view, 'throttle_scopes', {})
+    return scopes.get(getattr(view, 'action', None),
+                      getattr(view, 'throttle_scope', None))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle by token buckets, rates are DEFAULT_THROTTLE_RATES of
+    the user, anon and scope buckets. Takes one call to the store
+    whatever the number of buckets.
+    """
+
+    def __init__(self) -> None:
+        self.duration = 0.0
+
+    def allow_request(self, request, view) -> bool:
+        if not get_options()['ENABLED']:
+            return True
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ident, scopes = f'user:{user.pk}', ['user']
+        else:
+            ident, scopes = f'ip:{self.get_ident(request)}', ['anon']
+        scope = get_scope(view)
+        if scope is not None:
+            scopes.append(scope)
+        buckets = [(f'throttle:{scope}:{ident}', *parse_rate(rates[scope]))
+                   for scope in scopes if rates.get(scope)]
+        if not buckets:
+            return True
+        self.duration = get_store().take(buckets)
+        return not self.duration
+
+    def get_ident(self, request) -> str:
+        """
+        Return the client IP, X-Forwarded-For is only read when
+        NUM_PROXIES tells how many proxies set it, clients could
+        otherwise send a new value for every request.
+        """
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR', '')
+        return super().get_ident(request)
+
+    def wait(self) -> Optional[float]:
+        return self.duration or None
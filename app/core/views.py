@@ -1,3 +1,80 @@
-from django.shortcuts import render # noqa
+"""
+Views shared by the API apps
+"""
+import re
 
-# Create your views here.
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+from rest_framework import status
+
+from core import metrics
+from core.schema import store
+
+accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    OpenAPI schema served from memory.
+    Responses carry an ETag, and are gzipped for clients accepting it.
+    Requests for another language or API version
+    are generated on every request as before.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('lang') or self.api_version or request.version:
+            return super().get(request, *args, **kwargs)
+
+        rendered = store.get_rendered(request.accepted_renderer)
+        use_gzip = accepts_gzip.search(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        # each encoding is a different representation
+        etag = rendered.etag[:-1] + '-gzip"' if use_gzip else rendered.etag
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            content_type = request.accepted_media_type
+            if request.accepted_renderer.charset:
+                content_type += \
+                    f'; charset={request.accepted_renderer.charset}'
+            response = HttpResponse(
+                rendered.gzipped if use_gzip else rendered.content,
+                content_type=content_type)
+            response['Content-Disposition'] = \
+                f'inline; filename="{self._get_filename(request, None)}"'
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+
+def can_read_metrics(request, options) -> bool:
+    """return whether request brings the export token or a staff user"""
+    token = options['EXPORT_TOKEN']
+    if token:
+        auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(auth) == 2 and auth[0].lower() == 'bearer' and \
+                constant_time_compare(auth[1], token):
+            return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_active and user.is_staff
+
+
+def metrics_view(request):
+    """request metrics of this process in the Prometheus text format"""
+    options = metrics.get_options()
+    if not options['EXPORT']:
+        raise Http404
+    if not can_read_metrics(request, options):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.export(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from recipe import signals  # noqa
+        from core.metrics import register_collector
+        from recipe.cache import cache_metrics
+        register_collector(cache_metrics)
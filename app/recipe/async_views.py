@@ -0,0 +1,99 @@
+"""
+Async serving of recipe API reads
+"""
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+
+
+class DatabaseRequired(Exception):
+    """the response can not be built without queries"""
+
+
+def _database_required(*args, **kwargs):
+    raise DatabaseRequired
+
+
+class AsyncReadMixin:
+    """
+    Serve cached reads of a viewset from an async view.
+    With RECIPE_ASYNC_READS a GET of a cached action whose token and
+    response are in the caches, or that is answered with 304, is built
+    on the event loop without a thread. Every other request runs the
+    sync view through sync_to_async, as Django runs sync views.
+    Django 4.0 has no async ORM, so queries always run in a thread.
+    Reads of the shared Redis cache and throttle buckets on this path
+    are sync calls made on the event loop, each blocks the other
+    requests of the worker for a round trip. That suits a Redis close
+    to the workers; with a slow one leave RECIPE_ASYNC_READS off.
+    """
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        sync_view = super().as_view(actions, **initkwargs)
+        if not getattr(settings, 'RECIPE_ASYNC_READS', False):
+            return sync_view
+        run_sync = sync_to_async(sync_view)
+        cached = actions.get('get') in cls.cached_actions
+
+        async def view(request, *args, **kwargs):
+            if cached and request.method == 'GET':
+                try:
+                    return cls.respond_from_memory(
+                        actions, initkwargs, request, *args, **kwargs)
+                except DatabaseRequired:
+                    pass
+            return await run_sync(request, *args, **kwargs)
+
+        # routers and schema generators inspect these
+        for name in ('cls', 'initkwargs', 'actions', 'csrf_exempt'):
+            setattr(view, name, getattr(sync_view, name))
+        return view
+
+    def check_throttles(self, request):
+        # charged by respond_from_memory once it knows it answers,
+        # a request handed to the sync view is only charged there
+        if not getattr(self, 'defer_throttles', False):
+            super().check_throttles(request)
+
+    @classmethod
+    def respond_from_memory(cls, actions, initkwargs, request,
+                            *args, **kwargs):
+        """
+        Return response of request built from the caches only,
+        raise DatabaseRequired when a query would be needed.
+        """
+        self = cls(**initkwargs)
+        self.action_map = actions
+        for method, action in actions.items():
+            setattr(self, method, getattr(self, action))
+        self.setup(request, *args, **kwargs)
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        if not all(getattr(auth, 'authenticates_from_cache', None)
+                   and auth.authenticates_from_cache(request)
+                   for auth in request.authenticators):
+            raise DatabaseRequired
+        try:
+            self.defer_throttles = True
+            self.initial(request, *args, **kwargs)
+            response = self.cached_response(
+                _database_required, request, *args, **kwargs)
+            self.defer_throttles = False
+            self.check_throttles(request)
+        except (DatabaseRequired, SynchronousOnlyOperation):
+            # a query was attempted, the sync view answers instead
+            raise DatabaseRequired
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        response = self.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        # a plain response, Django renders template responses in a thread
+        plain = HttpResponse(response.content, status=response.status_code)
+        for name, value in response.items():
+            plain[name] = value
+        return plain
@@ -0,0 +1,366 @@
+"""
+In-process benchmark of the recipe API
+A deterministic dataset is seeded and every scenario drives one endpoint
+through the test client, so results only depend on the code and the
+machine. Each scenario reports throughput, latency percentiles, queries
+per request and peak memory, and can be compared with a stored baseline.
+Query counts do not depend on the machine and are always compared.
+Latency, throughput and memory only compare with a baseline saved on
+the same machine, regenerate it there with `benchmark --save` first.
+"""
+import gc
+import io
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PIL import Image
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+DATASET = {
+    'users': 5,
+    'recipes': 200,
+    'tags': 30,
+    'ingredients': 100,
+    # relations of every recipe
+    'recipe_tags': 3,
+    'recipe_ingredients': 8,
+}
+
+WORDS = (
+    'apple', 'basil', 'carrot', 'chili', 'garlic', 'ginger', 'honey',
+    'lemon', 'lentil', 'mango', 'mint', 'noodle', 'onion', 'pepper',
+    'potato', 'rice', 'salmon', 'tomato', 'walnut', 'yogurt',
+)
+
+# default relative slowdown reported as a regression
+TOLERANCE = 0.2
+
+
+class Scenario(NamedTuple):
+    """one endpoint driven by the benchmark"""
+    name: str
+    request: Callable[['BenchmarkContext', int], Any]
+
+
+class BenchmarkContext:
+    """Authenticated client of the first seeded user and its rows."""
+
+    def __init__(self, seed=0) -> None:
+        self.seed = seed
+        self.user = get_user_model().objects.order_by('id').first()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.recipe_ids = list(Recipe.objects.filter(
+            user=self.user).order_by('id').values_list('id', flat=True))
+        self.tags = list(Tag.objects.filter(
+            user=self.user).order_by('id').values_list('id', 'name'))
+        self.ingredients = list(Ingredient.objects.filter(
+            user=self.user).order_by('id').values_list('id', 'name'))
+        self.image = _png()
+
+    def recipe_id(self, i) -> int:
+        return self.recipe_ids[i % len(self.recipe_ids)]
+
+    def random(self, i) -> random.Random:
+        """
+        Return the random picks of request i, the same whatever the
+        number of requests run before, so each request runs the same
+        queries in every run.
+        """
+        return random.Random(f'{self.seed}:{i}')
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 80, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def seed(seed=0, **sizes) -> dict[str, int]:
+    """
+    Insert the benchmark dataset into an empty database,
+    the same seed always gives the same rows. Return rows by table.
+    """
+    sizes = {**DATASET, **sizes}
+    rnd = random.Random(seed)
+    User = get_user_model()
+    users = [User.objects.create_user(f'bench{n}@example.com', 'benchpass')
+             for n in range(sizes['users'])]
+    Tag.objects.bulk_create([
+        Tag(user=user, name=f'{WORDS[n % len(WORDS)]}-{n}')
+        for user in users for n in range(sizes['tags'])])
+    Ingredient.objects.bulk_create([
+        Ingredient(user=user, name=f'{WORDS[-n % len(WORDS)]}-{n}')
+        for user in users for n in range(sizes['ingredients'])])
+    Recipe.objects.bulk_create([
+        Recipe(
+            user=user,
+            title=' '.join(rnd.sample(WORDS, 3)),
+            description=' '.join(rnd.choices(WORDS, k=20)),
+            time_minutes=rnd.randint(5, 120),
+            price=Decimal(rnd.randint(100, 9999)) / 100,
+            link=f'https://example.com/{n}')
+        for user in users for n in range(sizes['recipes'])])
+    # primary keys are read back, not every backend returns them
+    tags = _ids_by_user(Tag)
+    ingredients = _ids_by_user(Ingredient)
+    recipes = list(Recipe.objects.order_by('id').values_list('id', 'user'))
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id, user_id in recipes
+        for tag_id in _sample(rnd, tags[user_id], sizes['recipe_tags'])])
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(
+            recipe_id=recipe_id, ingredient_id=ingredient_id)
+        for recipe_id, user_id in recipes
+        for ingredient_id in _sample(
+            rnd, ingredients[user_id], sizes['recipe_ingredients'])])
+    Tag.objects.recount()
+    Ingredient.objects.recount()
+    return {
+        'users': len(users),
+        'tags': Tag.objects.count(),
+        'ingredients': Ingredient.objects.count(),
+        'recipes': len(recipes),
+        'recipe_tags': Recipe.tags.through.objects.count(),
+        'recipe_ingredients': Recipe.ingredients.through.objects.count(),
+    }
+
+
+def _sample(rnd, population, count) -> list:
+    return rnd.sample(population, min(count, len(population)))
+
+
+def _ids_by_user(model) -> dict[int, list[int]]:
+    ids: dict[int, list[int]] = {}
+    for pk, user_id in model.objects.order_by('id').values_list(
+            'id', 'user'):
+        ids.setdefault(user_id, []).append(pk)
+    return ids
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def _detail(i, ctx) -> str:
+    return reverse('recipe:recipe-detail', args=[ctx.recipe_id(i)])
+
+
+def recipe_list(ctx, i):
+    return ctx.client.get(RECIPES_URL)
+
+
+def recipe_filter(ctx, i):
+    rnd = ctx.random(i)
+    tags = rnd.sample(ctx.tags, 2)
+    ingredient = rnd.choice(ctx.ingredients)
+    return ctx.client.get(RECIPES_URL, {
+        'tags': ','.join(str(pk) for pk, _ in tags),
+        'ingredients': ingredient[0]})
+
+
+def recipe_search(ctx, i):
+    return ctx.client.get(
+        RECIPES_URL, {'search': ctx.random(i).choice(WORDS)})
+
+
+def recipe_detail(ctx, i):
+    return ctx.client.get(_detail(i, ctx))
+
+
+def recipe_create(ctx, i):
+    rnd = ctx.random(i)
+    return ctx.client.post(RECIPES_URL, {
+        'title': f'bench recipe {i}',
+        'time_minutes': 10,
+        'price': '4.50',
+        'tags': [{'name': name} for _, name in rnd.sample(ctx.tags, 2)],
+        'ingredients': [
+            {'name': name} for _, name in rnd.sample(
+                ctx.ingredients, 4)] + [{'name': f'bench-{i}'}],
+    }, format='json')
+
+
+def recipe_update(ctx, i):
+    return ctx.client.patch(_detail(i, ctx), {
+        'title': f'updated {i}',
+        'tags': [{'name': name} for _, name in ctx.random(i).sample(
+            ctx.tags, 3)],
+    }, format='json')
+
+
+def recipe_upload_image(ctx, i):
+    image = SimpleUploadedFile('bench.png', ctx.image, 'image/png')
+    return ctx.client.post(
+        reverse('recipe:recipe-upload-image', args=[ctx.recipe_id(i)]),
+        {'image': image}, format='multipart')
+
+
+def tag_list(ctx, i):
+    return ctx.client.get(TAGS_URL)
+
+
+def tag_update(ctx, i):
+    pk, name = ctx.tags[i % len(ctx.tags)]
+    return ctx.client.patch(
+        reverse('recipe:tag-detail', args=[pk]), {'name': name})
+
+
+def ingredient_list(ctx, i):
+    return ctx.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+
+SCENARIOS = [Scenario(func.__name__, func) for func in (
+    recipe_list, recipe_filter, recipe_search, recipe_detail,
+    recipe_create, recipe_update, recipe_upload_image,
+    tag_list, tag_update, ingredient_list)]
+
+
+def percentile(ordered, fraction) -> float:
+    """return the fraction percentile of sorted values, interpolated"""
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def run_scenario(scenario, ctx, iterations=50, warmup=5) -> dict[str, Any]:
+    """
+    Return measures of scenario, latencies in milliseconds.
+    Requests run in this thread on an in-memory database, so they are
+    timed in process CPU time, which other load on the machine does not
+    inflate like wall time. Peak memory is taken in a separate pass,
+    tracemalloc slows every allocation and would distort the latencies.
+    """
+    for i in range(warmup):
+        _check(scenario, scenario.request(ctx, i))
+    # garbage of earlier scenarios is not collected during this one
+    gc.collect()
+    latencies = []
+    queries = []
+    for i in range(warmup, warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.process_time()
+            response = scenario.request(ctx, i)
+            latencies.append(time.process_time() - start)
+        _check(scenario, response)
+        queries.append(len(captured))
+    tracemalloc.start()
+    try:
+        for i in range(min(iterations, 5)):
+            tracemalloc.reset_peak()
+            scenario.request(ctx, warmup + iterations + i)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    latencies.sort()
+    return {
+        'requests': iterations,
+        'throughput': round(iterations / sum(latencies), 1),
+        'p50': round(percentile(latencies, .50) * 1000, 3),
+        'p95': round(percentile(latencies, .95) * 1000, 3),
+        'p99': round(percentile(latencies, .99) * 1000, 3),
+        'queries': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+        'peak_memory': peak,
+    }
+
+
+def _check(scenario, response) -> None:
+    if response.status_code >= 400:
+        raise AssertionError(
+            f'{scenario.name} failed with {response.status_code}: '
+            f'{response.content[:200]!r}')
+
+
+def run(names=None, iterations=50, warmup=5, seed=0,
+        report: Optional[Callable[[str, dict], None]] = None
+        ) -> dict[str, dict[str, Any]]:
+    """run scenarios of names, all by default, on the seeded database"""
+    scenarios = [scenario for scenario in SCENARIOS
+                 if names is None or scenario.name in names]
+    results = {}
+    for scenario in scenarios:
+        # a fresh context per scenario keeps its requests independent
+        # of which other scenarios ran before
+        ctx = BenchmarkContext(seed)
+        results[scenario.name] = run_scenario(
+            scenario, ctx, iterations, warmup)
+        if report:
+            report(scenario.name, results[scenario.name])
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE,
+            timings=False) -> list[str]:
+    """
+    Return regressions of results against baseline.
+    The most queries of one request may not grow at all, the mean
+    depends on which requests of a scenario hit a cache or an empty
+    filter and on the number of requests run, so it is only reported.
+    With timings, median and p95 latency, throughput and memory may
+    move by tolerance, p99 of a short run is too noisy and only
+    reported.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if 'max_queries' in before and \
+                current['max_queries'] > before['max_queries']:
+            regressions.append(f'{name}: queries per request '
+                               f'{before["max_queries"]} -> '
+                               f'{current["max_queries"]}')
+        if not timings:
+            continue
+        for key in ('p50', 'p95', 'peak_memory'):
+            if current[key] > before[key] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {key} {before[key]} -> {current[key]}')
+        if current['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput '
+                               f'{before["throughput"]} -> '
+                               f'{current["throughput"]}')
+    return regressions
+
+
+def get_baseline_file() -> Path:
+    return Path(getattr(settings, 'BENCHMARK_BASELINE_FILE',
+                        Path(settings.BASE_DIR) / 'benchmark-baseline.json'))
+
+
+def load_baseline(path=None) -> dict[str, Any]:
+    """return stored results, empty when there are none"""
+    try:
+        return json.loads(Path(path or get_baseline_file()).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results, path=None) -> Path:
+    path = Path(path or get_baseline_file())
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+    return path
@@ -0,0 +1,251 @@
+"""
+Bulk operations for recipe API
+"""
+from typing import Any
+
+from django.db import transaction
+
+from rest_framework.exceptions import ParseError, ValidationError
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient, )
+
+from recipe.serializers import (
+    RecipeDetailSerializer,
+    get_or_create_named, )
+from recipe.signals import muted
+
+# relations of a recipe edited in bulk
+NESTED = {'tags': Tag, 'ingredients': Ingredient}
+
+
+class RecipeImporter:
+    """
+    Validate and insert recipes of one user in chunks.
+    Each chunk is written with bulk inserts in one transaction and tags
+    and ingredients are resolved once for the whole import.
+    """
+    chunk_size = 500
+
+    def __init__(self, user, context, chunk_size=None) -> None:
+        self.user = user
+        self.context = context
+        self.chunk_size = chunk_size or self.chunk_size
+        self.serializer = RecipeDetailSerializer(context=context)
+        # name -> id of tags and ingredients already resolved
+        self.resolved: dict[Any, dict[str, int]] = {Tag: {}, Ingredient: {}}
+
+    def run(self, rows) -> list[dict[str, Any]]:
+        """import rows and return one result per row"""
+        results: list[dict[str, Any]] = []
+        chunk: list[tuple[int, Any]] = []
+        try:
+            for row in rows:
+                chunk.append((len(results) + len(chunk), row))
+                if len(chunk) == self.chunk_size:
+                    results.extend(self._import_chunk(chunk))
+                    chunk = []
+        except ParseError as exc:
+            # rows after a broken line can not be trusted, stop reading
+            failed = {'index': len(results) + len(chunk),
+                      'status': 'error',
+                      'errors': {'non_field_errors': [str(exc.detail)]}, }
+        else:
+            failed = None
+        if chunk:
+            results.extend(self._import_chunk(chunk))
+        if failed:
+            results.append(failed)
+        return results
+
+    def _validate(self, chunk) -> tuple[list, list]:
+        """split chunk into validated data and error results"""
+        valid, errors = [], []
+        for index, row in chunk:
+            try:
+                data = self.serializer.run_validation(row)
+            except ValidationError as exc:
+                errors.append({
+                    'index': index,
+                    'status': 'error',
+                    'errors': exc.detail, })
+            else:
+                valid.append((index, data))
+        return valid, errors
+
+    def _resolve(self, model, items) -> None:
+        """make sure every name in items has a known id"""
+        cache = self.resolved[model]
+        missing = [item for item in items if item.get('name', '') not in cache]
+        for obj in get_or_create_named(model, self.user, missing):
+            cache[obj.name] = obj.id
+
+    def _import_chunk(self, chunk) -> list[dict[str, Any]]:
+        """validate and write one chunk"""
+        valid, results = self._validate(chunk)
+        if not valid:
+            return results
+        nested = NESTED
+        with transaction.atomic():
+            for field, model in nested.items():
+                self._resolve(model, [item for _, data in valid
+                                      for item in data.get(field, [])])
+            recipes = Recipe.objects.bulk_create([
+                Recipe(user=self.user, **{
+                    key: value for key, value in data.items()
+                    if key not in nested})
+                for _, data in valid])
+            for field, model in nested.items():
+                linked = self._link(
+                    field, model, recipes, [d for _, d in valid])
+                # bulk inserts send no m2m_changed, count in one UPDATE
+                model.objects.filter(pk__in=linked).recount()
+        results.extend(
+            {'index': index, 'status': 'created', 'id': recipe.id}
+            for (index, _), recipe in zip(valid, recipes))
+        results.sort(key=lambda result: result['index'])
+        return results
+
+    def _link(self, field, model, recipes, rows) -> set[int]:
+        """
+        Bulk insert the through table rows of one relation,
+        return ids of the linked tags or ingredients.
+        """
+        through = getattr(Recipe, field).through
+        target = Recipe._meta.get_field(field).m2m_reverse_name()
+        ids = self.resolved[model]
+        links = []
+        for recipe, data in zip(recipes, rows):
+            names = dict.fromkeys(
+                item.get('name', '') for item in data.get(field, []))
+            links.extend(
+                through(recipe_id=recipe.id, **{target: ids[name]})
+                for name in names)
+        through.objects.bulk_create(links)
+        return {getattr(link, target) for link in links}
+
+
+def _error(index, pk, field, message) -> dict[str, Any]:
+    return {'index': index, 'id': pk, 'status': 'error',
+            'errors': {field: [message]}, }
+
+
+def _linked_ids(field, recipe_ids) -> set[int]:
+    """return ids of tags or ingredients linked to recipe_ids"""
+    through = getattr(Recipe, field).through
+    target = Recipe._meta.get_field(field).m2m_reverse_name()
+    return set(through.objects.filter(recipe_id__in=recipe_ids).values_list(
+        target, flat=True))
+
+
+class RecipeBulkEditor:
+    """
+    Update or delete recipes of one user with set-based statements.
+    The changes of all valid rows are applied in one transaction
+    without per-row signals, counts of the tags and ingredients
+    involved are rebuilt once at the end.
+    """
+
+    def __init__(self, user, context) -> None:
+        self.user = user
+        self.serializer = RecipeDetailSerializer(context=context, partial=True)
+
+    def _check_ids(self, ids) -> list[Any]:
+        """
+        Return an error result for every id that is not one recipe of
+        the user, None for the valid ones.
+        """
+        valid = [isinstance(pk, int) and not isinstance(pk, bool)
+                 for pk in ids]
+        owned = set(Recipe.objects.filter(
+            user=self.user,
+            pk__in=[pk for pk, ok in zip(ids, valid) if ok],
+        ).values_list('id', flat=True))
+        seen: set[int] = set()
+        errors: list[Any] = []
+        for index, (pk, ok) in enumerate(zip(ids, valid)):
+            if not ok:
+                errors.append(_error(index, pk, 'id', 'expected a recipe id'))
+                continue
+            if pk in seen:
+                errors.append(_error(index, pk, 'id', 'duplicated id'))
+            elif pk not in owned:
+                errors.append(_error(index, pk, 'id', 'recipe not found'))
+            else:
+                errors.append(None)
+            seen.add(pk)
+        return errors
+
+    def update(self, rows) -> list[dict[str, Any]]:
+        """
+        Apply partial changes of rows, each row holds the id of its
+        recipe. Return one result per row.
+        """
+        rows = list(rows)
+        ids = [row.get('id') if isinstance(row, dict) else None
+               for row in rows]
+        results = self._check_ids(ids)
+        # changed columns -> ids of recipes, one UPDATE for each
+        changes: dict[tuple, list[int]] = {}
+        nested: dict[str, dict[int, list]] = {field: {} for field in NESTED}
+        for index, (pk, row) in enumerate(zip(ids, rows)):
+            if results[index] is not None:
+                continue
+            try:
+                data = self.serializer.run_validation(
+                    {key: value for key, value in row.items() if key != 'id'})
+            except ValidationError as exc:
+                results[index] = {'index': index, 'id': pk, 'status': 'error',
+                                  'errors': exc.detail, }
+                continue
+            for field in NESTED:
+                if field in data:
+                    nested[field][pk] = data.pop(field)
+            if data:
+                changes.setdefault(tuple(sorted(data.items())), []).append(pk)
+            results[index] = {'index': index, 'id': pk, 'status': 'updated'}
+        with transaction.atomic(), muted():
+            for columns, recipe_ids in changes.items():
+                Recipe.objects.filter(pk__in=recipe_ids).update(
+                    **dict(columns))
+            for field, items in nested.items():
+                if items:
+                    self._relink(field, items)
+        return results
+
+    def _relink(self, field, items) -> None:
+        """replace the field links of recipes in items with their names"""
+        model = NESTED[field]
+        through = getattr(Recipe, field).through
+        target = Recipe._meta.get_field(field).m2m_reverse_name()
+        found = {obj.name: obj.id for obj in get_or_create_named(
+            model, self.user,
+            [item for names in items.values() for item in names])}
+        links = through.objects.filter(recipe_id__in=list(items))
+        touched = set(links.values_list(target, flat=True))
+        links.delete()
+        new = [through(recipe_id=pk, **{target: found[name]})
+               for pk, names in items.items()
+               for name in dict.fromkeys(
+                   item.get('name', '') for item in names)]
+        through.objects.bulk_create(new)
+        touched.update(getattr(link, target) for link in new)
+        model.objects.filter(pk__in=touched).recount()
+
+    def delete(self, ids) -> list[dict[str, Any]]:
+        """delete recipes of ids, return one result per id"""
+        ids = list(ids)
+        results = self._check_ids(ids)
+        deleted = [pk for pk, result in zip(ids, results) if result is None]
+        if not deleted:
+            return results
+        with transaction.atomic(), muted():
+            touched = {field: _linked_ids(field, deleted)
+                       for field in NESTED}
+            Recipe.objects.filter(pk__in=deleted).delete()
+            for field, model in NESTED.items():
+                model.objects.filter(pk__in=touched[field]).recount()
+        return [result or {'index': index, 'id': pk, 'status': 'deleted'}
+                for index, (pk, result) in enumerate(zip(ids, results))]
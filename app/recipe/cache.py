@@ -0,0 +1,249 @@
+"""
+Per user response cache of recipe API
+"""
+import hashlib
+import json
+import math
+import pickle
+import threading
+import time
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.metrics import format_metric
+
+DEFAULTS = {
+    'ENABLED': False,
+    # answer If-None-Match and If-Modified-Since from the data version
+    'CONDITIONAL': False,
+    # alias from CACHES, it has to be shared by all workers
+    'ALIAS': 'default',
+    # seconds a cached response is kept
+    'TIMEOUT': 300,
+}
+
+# response headers stored together with the cached data
+CACHED_HEADERS = ('Link',)
+
+
+def get_options() -> dict[str, Any]:
+    """return response cache settings"""
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_options()['ALIAS']]
+
+
+def _version_key(user_id) -> str:
+    return f'recipe:version:{user_id}'
+
+
+def _modified_key(user_id) -> str:
+    return f'recipe:modified:{user_id}'
+
+
+def _new_version() -> int:
+    """
+    Return a version larger than any counter issued before, so a counter
+    lost by cache eviction never comes back with an old value.
+    """
+    return time.time_ns() // 1000
+
+
+def get_version(user_id) -> int:
+    """return current data version of user"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id) -> None:
+    """invalidate every cached response of user"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_version(), None)
+    # the next whole second, so a write in the second a Last-Modified
+    # was sent in always comes out newer than it
+    cache.set(_modified_key(user_id), math.floor(time.time()) + 1, None)
+
+
+def get_modified(user_id) -> Any:
+    """
+    Return the second after the last write of user, None if unknown.
+    """
+    return get_cache().get(_modified_key(user_id))
+
+
+class CacheStats:
+    """Counters of the response cache of this process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.stores = 0
+            self.stored_bytes = 0
+
+    def hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def miss(self, size=None) -> None:
+        with self._lock:
+            self.misses += 1
+            if size is not None:
+                self.stores += 1
+                self.stored_bytes += size
+
+    def as_dict(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'stores': self.stores,
+                # size of pickled responses written, not of live entries
+                'stored_bytes': self.stored_bytes,
+            }
+
+
+stats = CacheStats()
+
+
+def cache_metrics() -> Iterator[str]:
+    """yield response cache counters in the Prometheus text format"""
+    counts = stats.as_dict()
+    for name, documentation in (
+            ('hits', 'Responses served from the cache.'),
+            ('misses', 'Lookups missing the cache.'),
+            ('stores', 'Responses written to the cache.'),
+            ('stored_bytes', 'Bytes of responses written to the cache.')):
+        yield from format_metric(
+            f'recipe_response_cache_{name}_total', 'counter',
+            documentation, [({}, counts[name])])
+
+
+class CachedResponseMixin:
+    """
+    Cache list and retrieve responses per user and answer conditional GETs.
+    Keys and ETags contain the data version of the user, a write bumps
+    the version so invalidation is one increment and old keys simply
+    expire. A matching If-None-Match is answered with 304 before any
+    query or serializer runs.
+    Views with a retrieve action wrap it with cached_response too.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_request_digest(self, request) -> str:
+        """return digest of everything that selects the response data"""
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists())
+        raw = json.dumps([
+            self.basename,
+            self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            params,
+        ])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get_etag(self, request, version, digest) -> str:
+        """return strong ETag of the rendered response"""
+        media_type = request.accepted_media_type or ''
+        raw = f'{version}:{digest}:{media_type}'
+        return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+    @staticmethod
+    def is_not_modified(request, etag, modified) -> bool:
+        """return whether the client copy of the response is current"""
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = [tag[2:] if tag.startswith('W/') else tag
+                    for tag in parse_etags(if_none_match)]
+            return '*' in tags or etag in tags
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and modified is not None and \
+            modified <= since
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """return response of handler, from the cache when possible"""
+        options = get_options()
+        use_cache = options['ENABLED']
+        conditional = options['CONDITIONAL']
+        if self.action not in self.cached_actions or \
+                not (use_cache or conditional):
+            return handler(request, *args, **kwargs)
+
+        user_id = request.user.pk
+        version = get_version(user_id)
+        digest = self.get_request_digest(request)
+        validators = {}
+        if conditional:
+            etag = self.get_etag(request, version, digest)
+            modified = get_modified(user_id)
+            validators['ETag'] = etag
+            # until its second is over more writes may come with the
+            # same time, the client only gets the date once it is final
+            if modified is not None and modified <= time.time():
+                validators['Last-Modified'] = http_date(modified)
+            if self.is_not_modified(request, etag, modified):
+                return Response(
+                    status=status.HTTP_304_NOT_MODIFIED, headers=validators)
+
+        if use_cache:
+            response = self._cache_lookup(
+                f'recipe:response:{user_id}:{version}:{digest}',
+                handler, request, *args, **kwargs)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in validators.items():
+                response[name] = value
+        return response
+
+    def _cache_lookup(self, key, handler, request, *args, **kwargs):
+        """return cached response of key or store the one of handler"""
+        cache = get_cache()
+        entry = cache.get(key)
+        if entry is not None:
+            stats.hit()
+            data, headers = pickle.loads(entry)
+            response = Response(data, headers=headers)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            stats.miss()
+            return response
+        headers = {name: response[name]
+                   for name in CACHED_HEADERS if response.has_header(name)}
+        # stored pickled so the size of every entry is known
+        entry = pickle.dumps((response.data, headers))
+        cache.set(key, entry, get_options()['TIMEOUT'])
+        stats.miss(len(entry))
+        response['X-Cache'] = 'MISS'
+        return response
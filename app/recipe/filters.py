@@ -0,0 +1,98 @@
+"""
+Filters for recipe API
+"""
+import re
+
+from django.db import connections
+from django.db.models import (
+    BooleanField,
+    Exists,
+    FloatField,
+    OuterRef,
+    Value, )
+from django.db.models.expressions import RawSQL
+
+from core.models import Recipe
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCH_MODES = (MATCH_ANY, MATCH_ALL)
+
+
+def _relation(field) -> tuple:
+    """return through model and its recipe and target columns"""
+    relation = Recipe._meta.get_field(field)
+    return (relation.remote_field.through,
+            relation.m2m_column_name(),
+            relation.m2m_reverse_name())
+
+
+def filter_by_related(queryset, field, ids, mode=MATCH_ANY):
+    """
+    Keep recipes linked to any or all of ids through relation field.
+    Uses correlated EXISTS subqueries on the through table,
+    so recipes are never multiplied by a join and need no DISTINCT.
+    """
+    through, recipe_column, target_column = _relation(field)
+    links = through.objects.filter(**{recipe_column: OuterRef('pk')})
+    if mode == MATCH_ALL:
+        for pk in dict.fromkeys(ids):
+            queryset = queryset.filter(
+                Exists(links.filter(**{target_column: pk})))
+        return queryset
+    return queryset.filter(
+        Exists(links.filter(**{f'{target_column}__in': ids})))
+
+
+def filter_assigned(queryset, field):
+    """keep tags or ingredients used by at least one recipe"""
+    through, _, target_column = _relation(field)
+    return queryset.filter(
+        Exists(through.objects.filter(**{target_column: OuterRef('pk')})))
+
+
+# text search configuration of the search_vector column
+SEARCH_CONFIG = 'english'
+# name of the FTS5 table mirroring recipes on SQLite
+SEARCH_TABLE = 'core_recipe_fts'
+
+
+def search_words(text) -> list[str]:
+    """return words of search text, any query syntax is dropped"""
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def search(queryset, text):
+    """
+    Keep recipes whose title or description contain every word of text,
+    words match as prefixes. Adds search_rank, higher is a better match
+    and title matches weigh more than description ones.
+    Uses the GIN indexed search_vector on PostgreSQL and FTS5 on SQLite.
+    """
+    words = search_words(text)
+    if not words:
+        return queryset.none().annotate(search_rank=Value(0.0))
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        # joined once, a correlated MATCH would run the search per row
+        queryset = queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE}.rowid = {table}.id',
+                   f'{SEARCH_TABLE} MATCH %s'],
+            params=[match])
+        # bm25 is lower for better matches, the title weighs 10 times more
+        rank = RawSQL(f'-bm25({SEARCH_TABLE}, 10.0, 1.0)', (),
+                      output_field=FloatField())
+        return queryset.annotate(search_rank=rank)
+    terms = ' & '.join(f'{word}:*' for word in words)
+    condition = RawSQL(
+        f'{table}.search_vector @@ to_tsquery(%s, %s)',
+        (SEARCH_CONFIG, terms), output_field=BooleanField())
+    rank = RawSQL(
+        f'ts_rank({table}.search_vector, to_tsquery(%s, %s))'
+        # real would not round trip through cursors, see SearchPagination
+        '::double precision',
+        (SEARCH_CONFIG, terms), output_field=FloatField())
+    return queryset.filter(condition).annotate(search_rank=rank)
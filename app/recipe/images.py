@@ -0,0 +1,168 @@
+"""
+Background processing of recipe images
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+from core.models import Recipe, recipe_image_file_path
+
+from recipe.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # number of threads decoding and encoding images
+    'WORKERS': 2,
+    # longest side in pixels of a processed image
+    'MAX_SIZE': 1600,
+    'QUALITY': 85,
+    # process in the calling thread, used by tests and management commands
+    'SYNC': False,
+    # seconds after which a pending or processing image counts as lost,
+    # e.g. by a worker that was restarted, see recover_images
+    'RECOVER_AFTER': 600,
+}
+
+# formats accepted on upload, the common ones ImageField accepted before
+# uploads were processed, they are stored as JPEG or PNG
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP', 'MPO', 'BMP', 'TIFF')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_options() -> dict[str, Any]:
+    """return image processing settings"""
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_IMAGES', {})}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the worker pool of this process.
+    Created on first use so forked uWSGI workers each get their own.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_options()['WORKERS'],
+                thread_name_prefix='recipe-image')
+        return _executor
+
+
+def schedule(recipe_id) -> None:
+    """process image of recipe once the current transaction commits"""
+    transaction.on_commit(lambda: submit(recipe_id))
+
+
+def submit(recipe_id) -> None:
+    """hand image of recipe to the worker pool"""
+    if get_options()['SYNC']:
+        process_image(recipe_id)
+    else:
+        get_executor().submit(_run_in_worker, recipe_id)
+
+
+def _run_in_worker(recipe_id) -> None:
+    """process one image and release the database connection of thread"""
+    try:
+        process_image(recipe_id)
+    except Exception:
+        logger.exception('processing image of recipe %s failed', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def _encode(source, options) -> tuple[bytes, str]:
+    """return re-encoded image without metadata and its file extension"""
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((options['MAX_SIZE'], options['MAX_SIZE']))
+        output = io.BytesIO()
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img.save(output, format='PNG', optimize=True)
+            return output.getvalue(), '.png'
+        # the profile only describes the pixels when they stay RGB,
+        # a CMYK or grayscale profile would skew the converted colors
+        icc_profile = img.info.get('icc_profile') \
+            if img.mode == 'RGB' else None
+        img.convert('RGB').save(
+            output, format='JPEG', quality=options['QUALITY'],
+            optimize=True, icc_profile=icc_profile)
+        return output.getvalue(), '.jpg'
+
+
+def process_image(recipe_id) -> None:
+    """
+    Decode, strip EXIF, downscale and re-encode the image of recipe.
+    The processed file replaces the upload unless a newer upload
+    arrived in the meantime.
+    """
+    claimed = Recipe.objects.filter(
+        pk=recipe_id,
+        image_status=Recipe.ImageStatus.PENDING,
+    ).update(image_status=Recipe.ImageStatus.PROCESSING)
+    if not claimed:
+        return
+    recipe = Recipe.objects.only('id', 'user_id', 'image').get(pk=recipe_id)
+    source = recipe.image.name
+    storage = recipe.image.storage
+    try:
+        with storage.open(source, 'rb') as source_file:
+            content, ext = _encode(source_file, get_options())
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning('image %s of recipe %s is broken', source, recipe_id)
+        Recipe.objects.filter(pk=recipe_id, image=source).update(
+            image_status=Recipe.ImageStatus.FAILED)
+        bump_version(recipe.user_id)
+        return
+
+    name = storage.save(
+        recipe_image_file_path(recipe, f'image{ext}'), ContentFile(content))
+    replaced = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image=name, image_status=Recipe.ImageStatus.READY)
+    # drop the original, or our result when a newer upload won
+    storage.delete(source if replaced else name)
+    bump_version(recipe.user_id)
+
+
+def _uploaded_at(recipe) -> Optional[datetime]:
+    """return when the image of recipe was stored, None if unknown"""
+    try:
+        return recipe.image.storage.get_modified_time(recipe.image.name)
+    except (OSError, NotImplementedError, ValueError):
+        return None
+
+
+def requeue_lost(timeout=None) -> list[int]:
+    """
+    Set images pending or processing that were uploaded more than
+    timeout seconds ago back to pending and return their recipe ids.
+    Jobs only live in the worker pool, so a crash or restart leaves
+    them in these states.
+    """
+    if timeout is None:
+        timeout = get_options()['RECOVER_AFTER']
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    waiting = Recipe.objects.filter(image_status__in=(
+        Recipe.ImageStatus.PENDING, Recipe.ImageStatus.PROCESSING))
+    ids = []
+    for recipe in waiting.only('id', 'image'):
+        uploaded = _uploaded_at(recipe)
+        if uploaded is None or uploaded < cutoff:
+            ids.append(recipe.id)
+    # images done in the meantime keep their status
+    waiting.filter(pk__in=ids).update(
+        image_status=Recipe.ImageStatus.PENDING)
+    return ids
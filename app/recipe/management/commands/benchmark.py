@@ -0,0 +1,88 @@
+"""
+    Command for benchmarking the recipe API
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipe import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the recipe API in-process on a throwaway database '
+            'and compare the results with a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=[scenario.name for scenario in benchmark.SCENARIOS],
+            help='scenario to run, may be repeated, all by default')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--seed', type=int, default=0, help='seed of the dataset')
+        for name, size in benchmark.DATASET.items():
+            parser.add_argument(
+                f'--{name.replace("_", "-")}', type=int, default=size,
+                dest=name, help=f'{name} of every user (default {size})'
+                if name != 'users' else f'seeded users (default {size})')
+        parser.add_argument(
+            '--baseline', default=None,
+            help='baseline file, BENCHMARK_BASELINE_FILE by default')
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmark.TOLERANCE,
+            help='relative slowdown reported as a regression')
+        parser.add_argument(
+            '--timings', action='store_true',
+            help='also compare latency, throughput and memory, only '
+                 'with a baseline saved on this machine by --save')
+        parser.add_argument(
+            '--save', action='store_true',
+            help='store the results as the new baseline')
+        parser.add_argument(
+            '--json', action='store_true', help='print results as JSON')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            rows = benchmark.seed(options['seed'], **{
+                name: options[name] for name in benchmark.DATASET})
+            if not options['json']:
+                self.stdout.write('seeded ' + ', '.join(
+                    f'{count} {name}' for name, count in rows.items()))
+            results = benchmark.run(
+                options['scenarios'], options['iterations'],
+                options['warmup'], options['seed'],
+                report=None if options['json'] else self.report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        if options['save']:
+            path = benchmark.save_baseline(results, options['baseline'])
+            self.stdout.write(
+                self.style.SUCCESS(f'baseline written to {path}'))
+            return
+        baseline = benchmark.load_baseline(options['baseline'])
+        if not baseline:
+            self.stdout.write('no baseline to compare with.')
+            return
+        regressions = benchmark.compare(
+            results, baseline, options['tolerance'], options['timings'])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} regressions')
+        self.stdout.write(self.style.SUCCESS('no regression'))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<20} {result["throughput"]:>8.1f} req/s  '
+            f'p50 {result["p50"]:>8.2f} ms  p95 {result["p95"]:>8.2f} ms  '
+            f'p99 {result["p99"]:>8.2f} ms  '
+            f'{result["queries"]:>5.1f} queries  '
+            f'{result["peak_memory"] / 1024:>8.0f} KiB peak')
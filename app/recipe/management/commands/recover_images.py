@@ -0,0 +1,25 @@
+"""
+    Command for processing recipe images lost by a crash or restart
+"""
+from django.core.management.base import BaseCommand
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    help = ('Process again images left pending or processing for longer '
+            'than a timeout, run after a restart or periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=int, default=None,
+            help='seconds after which an image counts as lost, '
+                 'RECIPE_IMAGES RECOVER_AFTER by default')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        ids = images.requeue_lost(options['timeout'])
+        for recipe_id in ids:
+            images.process_image(recipe_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids)} lost images processed'))
@@ -0,0 +1,212 @@
+"""
+Pagination for recipe API
+"""
+import base64
+import binascii
+import json
+from typing import Any, Optional
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the values of a fixed ordering.
+    A page is selected with a WHERE on the last row seen instead of
+    an OFFSET and no COUNT is issued, so every page costs the same.
+    The body stays a plain list, links are sent in the Link header.
+    """
+    ordering: tuple[str, ...] = ('-id',)
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None) -> list:
+        """return one page of queryset"""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+        if position is not None:
+            position = self.convert_position(queryset, position)
+        ordering = self._flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        if rows:
+            if has_next:
+                self.next_position = self._position(rows[-1])
+            if has_previous:
+                self.previous_position = self._position(rows[0])
+        elif position is not None:
+            # empty page, link back to the rows around the cursor
+            if reverse:
+                self.next_position = position
+            else:
+                self.previous_position = position
+        return rows
+
+    def get_page_size(self, request) -> int:
+        """return page size from query params or the default one"""
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request) -> tuple[bool, Optional[list]]:
+        """return direction and position encoded in cursor param"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+        try:
+            reverse, position = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
+
+    def convert_position(self, queryset, position) -> list:
+        """
+        Return cursor values converted by the ordering fields of
+        queryset, values a client may have forged are never queried.
+        """
+        converted = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            try:
+                model_field = annotation.output_field if annotation \
+                    else queryset.model._meta.get_field(name)
+                value = model_field.to_python(value)
+            except (FieldDoesNotExist, ValidationError, TypeError,
+                    ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            converted.append(value)
+        return converted
+
+    def encode_cursor(self, reverse, position) -> str:
+        """return url of the page after or before position"""
+        encoded = base64.urlsafe_b64encode(
+            json.dumps([int(reverse), position]).encode('ascii'))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(False, self.next_position)
+
+    def get_previous_link(self) -> Optional[str]:
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(True, self.previous_position)
+
+    def get_paginated_response(self, data) -> Response:
+        """return page as a plain list with a Link header"""
+        links = [
+            f'<{url}>; rel="{rel}"' for url, rel in (
+                (self.get_next_link(), 'next'),
+                (self.get_previous_link(), 'prev'),
+            ) if url is not None]
+        headers = {'Link': ', '.join(links)} if links else None
+        return Response(data, headers=headers)
+
+    def get_paginated_response_schema(self, schema) -> dict:
+        return schema
+
+    def get_schema_operation_parameters(self, view) -> list[dict]:
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'cursor from the Link header of a page',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'number of results per page, '
+                               f'at most {self.max_page_size}',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def _position(self, row) -> list:
+        """return values of the ordering fields of row"""
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    @staticmethod
+    def _flip(ordering) -> tuple[str, ...]:
+        """return ordering in the opposite direction"""
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in ordering)
+
+    @staticmethod
+    def _after(ordering, position) -> Q:
+        """return filter for rows that come after position in ordering"""
+        names = [field.lstrip('-') for field in ordering]
+        lookups = ['lt' if field.startswith('-') else 'gt'
+                   for field in ordering]
+        condition: Any = None
+        for i, (name, lookup) in enumerate(zip(names, lookups)):
+            term = Q(**{f'{name}__{lookup}': position[i]})
+            for prev_name, value in zip(names[:i], position):
+                term &= Q(**{prev_name: value})
+            condition = term if condition is None else condition | term
+        if len(names) == 1:
+            return condition
+        # bound on the first field lets the database use a range scan
+        first = f'{names[0]}__{lookups[0]}e'
+        return Q(**{first: position[0]}) & condition
+
+
+class RecipePagination(KeysetPagination):
+    """pagination of recipes, newest first"""
+    ordering = ('-id',)
+
+
+class NamedPagination(KeysetPagination):
+    """pagination of tags and ingredients by name"""
+    ordering = ('-name', '-id')
+
+
+class SearchPagination(KeysetPagination):
+    """
+    pagination of search results, best matches first
+    search_rank must be a double, a cursor holds it as a Python float
+    and a real rank would not compare equal to its own cursor value.
+    """
+    ordering = ('-search_rank', '-id')
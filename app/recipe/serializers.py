@@ -3,10 +3,43 @@
 from typing import Any
 from core.models import Recipe, Tag, Ingredient
 
-from rest_framework import serializers
+from django.db import transaction
+
+from PIL import Image
 
+from rest_framework import serializers
 
-class IngredientSerializer(serializers.ModelSerializer):
+from core.metrics import TimedSerializerMixin
+from recipe.images import ALLOWED_FORMATS
+
+
+def get_or_create_named(model, user, items) -> list:
+    """
+    Return `model` rows of user for names in items, creating missing ones.
+    Missing names are inserted with ON CONFLICT DO NOTHING and read back,
+    so a concurrent request creating the same name never fails or
+    duplicates it. Uses at most three queries whatever the number of items.
+    """
+    names: list[str] = list(dict.fromkeys(
+        item.get('name', '') for item in items))
+    if not names:
+        return []
+    found: dict[str, Any] = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)}
+    missing = [model(user=user, name=name)
+               for name in names if name not in found]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        # rows ignored as conflicts have no pk, read all of them back
+        created = model.objects.filter(
+            user=user, name__in=[obj.name for obj in missing])
+        found.update((obj.name, obj) for obj in created)
+    return [found[name] for name in names]
+
+
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """serializer for ingredients"""
 
     class Meta:
@@ -15,7 +48,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields: list[str] = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin,
+                    serializers.ModelSerializer):
     """Serializer for Tag"""
 
     class Meta:
@@ -24,7 +58,39 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields: list[str] = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientCountSerializer(IngredientSerializer):
+    """ingredient with the number of recipes using it"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields: list[str] = IngredientSerializer.Meta.fields + [
+            'recipe_count']
+        read_only_fields: list[str] = ['id', 'recipe_count']
+
+
+class TagCountSerializer(TagSerializer):
+    """tag with the number of recipes using it"""
+
+    class Meta(TagSerializer.Meta):
+        fields: list[str] = TagSerializer.Meta.fields + ['recipe_count']
+        read_only_fields: list[str] = ['id', 'recipe_count']
+
+
+class SparseFieldsMixin:
+    """
+    Serializer rendering only the fields named by its fields argument,
+    every field when it is None.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class RecipeSerializer(SparseFieldsMixin,
+                       TimedSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializer for Recipe model"""
     tags: Any = TagSerializer(many=True, required=False)
     ingredients: Any = IngredientSerializer(many=True, required=False)
@@ -41,48 +107,35 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients', ]
         read_only_fields: dict[str] = ['id']
 
-    def _get_or_create_element(self, tags, recipe) -> Any:
-        """function for checking tag or creation it"""
+    def _set_related(self, recipe, field, items) -> None:
+        """replace tags or ingredients of recipe, creating missing ones"""
+        model = Recipe._meta.get_field(field).related_model
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag, )
-            recipe.tags.add(tag_obj)
-        return recipe
-
-    def _get_or_create_ingredient(self, ingredients, recipe) -> Any:
-        """function for checking tag or creation it"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            tag_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient, )
-            recipe.ingredients.add(tag_obj)
-        return recipe
+        objs = get_or_create_named(model, auth_user, items)
+        getattr(recipe, field).set(objs)
 
     def create(self, validated_data) -> Any:
         """Create a Recipe with custom tags"""
         tags: list[str] = validated_data.pop('tags', [])
         ingredients: list[str] = validated_data.pop('ingredients', [])
-        recipe: dict[str, str] = Recipe.objects.create(**validated_data)
-        self._get_or_create_ingredient(ingredients, recipe)
-        self._get_or_create_element(tags, recipe)
+        with transaction.atomic():
+            recipe: dict[str, str] = Recipe.objects.create(**validated_data)
+            self._set_related(recipe, 'ingredients', ingredients)
+            self._set_related(recipe, 'tags', tags)
         return recipe
 
     def update(self, instance, validated_data) -> Any:
         """function for update recipe"""
         tags: dict[str: str] = validated_data.pop('tags', None)
         ingredients: list[str] = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_element(tags, instance)
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredient(ingredients, instance)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            if tags is not None:
+                self._set_related(instance, 'tags', tags)
+            if ingredients is not None:
+                self._set_related(instance, 'ingredients', ingredients)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
         return instance
 
 
@@ -91,13 +144,32 @@ class RecipeDetailSerializer(RecipeSerializer):
 
     class Meta(RecipeSerializer.Meta):
 
-        fields: dict[str] = RecipeSerializer.Meta.fields + ['description']
+        fields: dict[str] = RecipeSerializer.Meta.fields + [
+            'description', 'image_status']
+        read_only_fields: list[str] = ['id', 'image_status']
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     '''Serializer for image'''
+    # only the header is checked here, decoding happens in recipe.images
+    image = serializers.FileField(required=True)
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields: list[str] = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
+        fields = ['id', 'image', 'image_status']
+        read_only_fields: list[str] = ['id', 'image_status']
+
+    def validate_image(self, value) -> Any:
+        """check that the upload starts like an image we can process"""
+        try:
+            with Image.open(value) as img:
+                image_format = img.format
+        except (OSError, Image.DecompressionBombError):
+            image_format = None
+        value.seek(0)
+        if image_format not in ALLOWED_FORMATS:
+            raise serializers.ValidationError(
+                'Upload a valid image. The file you uploaded was either '
+                'not an image or a corrupted image.')
+        return value
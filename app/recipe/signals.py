@@ -0,0 +1,119 @@
+"""
+Signal receivers keeping recipe API caches and recipe counts up to date
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete, )
+from django.dispatch import receiver
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient, )
+
+from recipe.cache import bump_version
+
+# set while a bulk operation keeps counts and versions itself
+_muted: ContextVar[bool] = ContextVar('recipe_signals_muted', default=False)
+
+
+@contextmanager
+def muted() -> Iterator[None]:
+    """
+    Silence the receivers of this module, the caller recounts and
+    bumps the version once for all the rows it changed.
+    """
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def bump_on_commit(user_id) -> None:
+    """bump data version of user once the transaction is committed"""
+    transaction.on_commit(lambda: bump_version(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def bump_on_change(sender, instance, **kwargs):
+    """bump version of the owner of a saved or deleted row"""
+    if _muted.get():
+        return
+    bump_on_commit(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_on_relation_change(sender, instance, action, **kwargs):
+    """bump version of the owner when recipe relations change"""
+    if action.startswith('post_') and not _muted.get():
+        bump_on_commit(instance.user_id)
+
+
+def _linked(sender, instance, reverse, pk_set) -> list:
+    """
+    Return ids at the other end of the links of instance in the
+    relation table sender, among pk_set when given.
+    """
+    target = 'tag' if sender is Recipe.tags.through else 'ingredient'
+    own, other = (target, 'recipe') if reverse else ('recipe', target)
+    links = sender.objects.filter(**{f'{own}_id': instance.pk})
+    if pk_set is not None:
+        links = links.filter(**{f'{other}_id__in': pk_set})
+    return list(links.values_list(f'{other}_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_relation_change(sender, instance, action, reverse, model, pk_set,
+                          **kwargs):
+    """
+    Keep recipe_count of tags and ingredients in the transaction of the
+    relation change. Removed links are read before the removal, remove()
+    also reports ids that were not linked.
+    """
+    if _muted.get():
+        return
+    removed = instance.__dict__.setdefault('_removed_links', {})
+    if action in ('pre_remove', 'pre_clear'):
+        removed[sender] = _linked(sender, instance, reverse, pk_set)
+        return
+    if action == 'post_add':
+        ids, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        ids, delta = removed.pop(sender, []), -1
+    else:
+        return
+    if not ids:
+        return
+    if reverse:
+        # instance is the tag or ingredient, ids are recipes
+        type(instance).objects.filter(pk=instance.pk).update(
+            recipe_count=F('recipe_count') + delta * len(ids))
+    else:
+        model.objects.filter(pk__in=ids).update(
+            recipe_count=F('recipe_count') + delta)
+
+
+@receiver(pre_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    """uncount a deleted recipe from its tags and ingredients"""
+    if _muted.get():
+        return
+    for model in (Tag, Ingredient):
+        model.objects.filter(recipe=instance).update(
+            recipe_count=F('recipe_count') - 1)
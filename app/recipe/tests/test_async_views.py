@@ -0,0 +1,144 @@
+"""Tests for async reads of recipe API"""
+import asyncio
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from core.authentication import (
+    CachedTokenAuthentication,
+    TokenCache,
+    get_token_cache, )
+from core.models import Recipe
+from recipe import views
+
+
+@override_settings(
+    RECIPE_ASYNC_READS=True,
+    RECIPE_RESPONSE_CACHE={'ENABLED': True, 'CONDITIONAL': True})
+class AsyncReadTests(TestCase):
+    """tests for reads served by async views"""
+
+    def setUp(self):
+        cache.clear()
+        get_token_cache().local.clear()
+        self.factory = RequestFactory()
+        self.user = get_user_model().objects.create_user(
+            'async@example.com', 'testpass123')
+        self.token = Token.objects.create(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='soup', price=Decimal('2.00'))
+        self.view = views.RecipeViewSet.as_view({'get': 'list'})
+
+    def get(self, view=None, **headers):
+        """return response of a token authenticated GET"""
+        request = self.factory.get(
+            '/api/recipe/recipes/',
+            HTTP_AUTHORIZATION=f'Token {self.token.key}', **headers)
+        return async_to_sync(view or self.view)(request)
+
+    def test_cached_read_is_served_from_memory(self):
+        """Test a cached read runs no query and no sync view."""
+        first = self.get()
+        first.render()
+
+        with self.assertNumQueries(0):
+            second = self.get()
+
+        self.assertIsInstance(first, Response)
+        self.assertIs(type(second), HttpResponse)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_not_modified_is_served_from_memory(self):
+        """Test a matching If-None-Match is answered from memory."""
+        etag = self.get()['ETag']
+
+        res = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertIs(type(res), HttpResponse)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_token_expiring_during_read(self):
+        """Test a token leaving the cache mid request runs no query."""
+        self.get().render()
+        entry = get_token_cache().get(self.token.key)
+
+        with patch.object(TokenCache, 'get', side_effect=[entry, None]), \
+                self.assertNumQueries(0):
+            res = self.get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_query_falls_back_to_sync_view(self):
+        """Test a query on the event loop hands over to the sync view."""
+        self.get().render()
+
+        def authenticate_credentials(key):
+            token = Token.objects.select_related('user').get(key=key)
+            return token.user, token
+
+        with patch.object(CachedTokenAuthentication,
+                          'authenticate_credentials',
+                          side_effect=authenticate_credentials):
+            res = self.get()
+
+        self.assertIsInstance(res, Response)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_throttles_charged_once(self):
+        """Test a read handed to the sync view takes one token."""
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'user': '3/min'}
+        with override_settings(
+                API_THROTTLE={'ENABLED': True, 'SHARED_CACHE': None},
+                REST_FRAMEWORK={**api_settings.user_settings,
+                                'DEFAULT_THROTTLE_RATES': rates}):
+            statuses = [self.get().status_code for _ in range(2)]
+            cache.clear()
+            statuses += [self.get().status_code for _ in range(2)]
+
+        self.assertEqual(statuses, [status.HTTP_200_OK] * 3 +
+                         [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_anonymous_read_is_rejected_from_memory(self):
+        """Test a request without token gets 401 without a query."""
+        request = self.factory.get('/api/recipe/recipes/')
+
+        with self.assertNumQueries(0):
+            res = async_to_sync(self.view)(request)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_write_falls_back_to_sync_view(self):
+        """Test methods other than GET run the sync view."""
+        view = views.RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+        request = self.factory.post(
+            '/api/recipe/recipes/',
+            {'title': 'stew', 'time_minutes': 5, 'price': '1.00'},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        res = async_to_sync(view)(request)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_disabled_returns_sync_view(self):
+        """Test the async view is only used when enabled."""
+        with override_settings(RECIPE_ASYNC_READS=False):
+            view = views.TagAPIView.as_view({'get': 'list'})
+
+        self.assertFalse(asyncio.iscoroutinefunction(view))
+        self.assertTrue(asyncio.iscoroutinefunction(self.view))
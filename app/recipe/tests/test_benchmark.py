@@ -0,0 +1,158 @@
+"""Tests for the recipe API benchmark"""
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.models import Recipe
+
+from recipe import benchmark
+
+SIZES = {'users': 2, 'recipes': 6, 'tags': 5, 'ingredients': 6}
+
+RESULT = {
+    'requests': 10, 'throughput': 100.0, 'p50': 5.0, 'p95': 8.0,
+    'p99': 9.0, 'queries': 3.0, 'max_queries': 3, 'peak_memory': 1000,
+}
+
+
+class BenchmarkTests(TestCase):
+    """Tests for seeding and running the benchmark."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(
+            MEDIA_ROOT=media, RECIPE_IMAGES={'SYNC': True})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def snapshot(self):
+        return list(Recipe.objects.order_by('id').values_list(
+            'user__email', 'title', 'price', 'tags__name'))
+
+    def test_seed_is_deterministic(self):
+        """Test the same seed gives the same dataset."""
+        rows = benchmark.seed(1, **SIZES)
+        first = self.snapshot()
+        get_user_model().objects.all().delete()
+
+        benchmark.seed(1, **SIZES)
+
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(rows['recipes'], 12)
+        self.assertEqual(rows['recipe_tags'], 36)
+
+    def test_run_every_scenario(self):
+        """Test every scenario succeeds and is measured."""
+        benchmark.seed(**SIZES)
+
+        results = benchmark.run(iterations=2, warmup=1)
+
+        self.assertEqual(
+            set(results), {scenario.name for scenario in benchmark.SCENARIOS})
+        for result in results.values():
+            self.assertEqual(set(result), set(RESULT))
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['p50'], result['p99'])
+
+    def test_requests_do_not_depend_on_iterations(self):
+        """Test a request makes the same picks whatever ran before it."""
+        benchmark.seed(**SIZES)
+        ctx = benchmark.BenchmarkContext()
+        ctx.client = Mock()
+
+        for i in (4, 1, 2, 4):
+            benchmark.recipe_filter(ctx, i)
+
+        calls = ctx.client.get.call_args_list
+        self.assertEqual(calls[0], calls[3])
+        self.assertNotEqual(calls[0], calls[1])
+
+
+class CompareTests(SimpleTestCase):
+    """Tests for comparing results with a baseline."""
+
+    def test_within_tolerance(self):
+        """Test small differences are not regressions."""
+        current = {**RESULT, 'p50': 5.5, 'p95': 9.0, 'throughput': 90.0}
+
+        self.assertEqual(benchmark.compare(
+            {'recipe_list': current}, {'recipe_list': RESULT},
+            timings=True), [])
+
+    def test_regressions(self):
+        """Test slower, bigger or chattier scenarios are flagged."""
+        current = {**RESULT, 'p95': 12.0, 'throughput': 50.0,
+                   'max_queries': 4, 'peak_memory': 5000}
+
+        regressions = benchmark.compare(
+            {'recipe_list': current, 'new': RESULT}, {'recipe_list': RESULT},
+            timings=True)
+
+        self.assertEqual(len(regressions), 4)
+        self.assertTrue(all(r.startswith('recipe_list:') for r in regressions))
+
+    def test_only_queries_by_default(self):
+        """Test timings of another machine are not compared by default."""
+        current = {**RESULT, 'p95': 12.0, 'throughput': 50.0,
+                   'peak_memory': 5000}
+
+        self.assertEqual(benchmark.compare(
+            {'recipe_list': current}, {'recipe_list': RESULT}), [])
+        self.assertEqual(benchmark.compare(
+            {'recipe_list': {**current, 'max_queries': 4}},
+            {'recipe_list': RESULT}),
+            ['recipe_list: queries per request 3 -> 4'])
+
+    def test_mean_queries_are_not_compared(self):
+        """Test cache hits of fewer requests do not flag a regression."""
+        current = {**RESULT, 'requests': 5, 'queries': 3.0}
+        before = {**RESULT, 'queries': 2.92}
+
+        self.assertEqual(benchmark.compare(
+            {'recipe_filter': current}, {'recipe_filter': before}), [])
+
+
+@patch('recipe.benchmark.run')
+@patch('recipe.benchmark.seed', return_value={})
+@patch('django.db.connection.creation')
+class BenchmarkCommandTests(SimpleTestCase):
+    """Tests for the benchmark command."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.baseline = Path(tmp.name) / 'baseline.json'
+
+    def test_save_and_compare(self, creation, seed, run):
+        """Test results are stored and compared with the baseline."""
+        run.return_value = {'recipe_list': RESULT}
+        call_command('benchmark', '--save', '--baseline', str(self.baseline),
+                     stdout=StringIO())
+        out = StringIO()
+
+        call_command('benchmark', '--baseline', str(self.baseline),
+                     stdout=out)
+
+        self.assertEqual(
+            json.loads(self.baseline.read_text()), {'recipe_list': RESULT})
+        self.assertIn('no regression', out.getvalue())
+        creation.destroy_test_db.assert_called_with(
+            creation.create_test_db.return_value, verbosity=0)
+
+    def test_regression_fails(self, creation, seed, run):
+        """Test a regression makes the command fail."""
+        benchmark.save_baseline({'recipe_list': RESULT}, self.baseline)
+        run.return_value = {'recipe_list': {**RESULT, 'max_queries': 10}}
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark', '--baseline', str(self.baseline),
+                         stdout=StringIO(), stderr=StringIO())
@@ -0,0 +1,263 @@
+"""Tests for bulk recipe API"""
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, Tag, Ingredient)
+
+BULK_URL = reverse('recipe:recipe-bulk-create')
+
+
+def recipe_payload(index, **kwargs):
+    """return payload of one recipe for bulk requests"""
+    payload = {
+        'title': f'recipe {index}',
+        'time_minutes': 10,
+        'price': '5.25',
+        'tags': [{'name': 'Dinner'}, {'name': f'tag {index % 3}'}],
+        'ingredients': [{'name': 'Salt'}],
+    }
+    payload.update(kwargs)
+    return payload
+
+
+class PrivateBulkCreateTests(TestCase):
+    """tests for bulk creation of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'bulk@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_from_json_array(self):
+        """Test creating recipes from a JSON array."""
+        payload = [recipe_payload(i) for i in range(5)]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 5)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 5)
+        recipe = recipes.get(id=res.data['results'][4]['id'])
+        self.assertEqual(recipe.title, 'recipe 4')
+        self.assertEqual(recipe.price, Decimal('5.25'))
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Dinner', 'tag 1'})
+
+    def test_bulk_create_dedupes_tags_and_ingredients(self):
+        """Test nested names are created once for the whole batch."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        payload = [recipe_payload(i) for i in range(7)]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        dinner = Tag.objects.get(user=self.user, name='Dinner')
+        self.assertEqual(dinner.recipe_set.count(), 7)
+        self.assertEqual(dinner.recipe_count, 7)
+
+    def test_bulk_create_from_ndjson_stream(self):
+        """Test creating recipes from newline delimited JSON."""
+        body = '\n'.join(json.dumps(recipe_payload(i)) for i in range(3))
+
+        res = self.client.post(
+            BULK_URL, body + '\n\n',
+            content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_create_reports_invalid_rows(self):
+        """Test invalid rows are reported and valid rows are created."""
+        payload = [
+            recipe_payload(0),
+            recipe_payload(1, price='not a price'),
+            recipe_payload(2), ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        statuses = [row['status'] for row in res.data['results']]
+        self.assertEqual(statuses, ['created', 'error', 'created'])
+        self.assertIn('price', res.data['results'][1]['errors'])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_broken_ndjson_line(self):
+        """Test rows before a broken NDJSON line are still created."""
+        body = json.dumps(recipe_payload(0)) + '\n{broken\n'
+
+        res = self.client.post(
+            BULK_URL, body, content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data['results'][1]['index'], 1)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_create_requires_list(self):
+        """Test an object instead of a list is rejected."""
+        res = self.client.post(BULK_URL, recipe_payload(0), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_query_count_is_flat(self):
+        """Test the number of queries does not grow with the batch."""
+        counts = []
+        for size in (2, 40):
+            user = get_user_model().objects.create_user(
+                f'bulk{size}@example.com', 'testpass123')
+            self.client.force_authenticate(user)
+            payload = [recipe_payload(i) for i in range(size)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.data['created'], size)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+
+class PrivateBulkEditTests(TestCase):
+    """tests for bulk update and delete of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'edit@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+        self.old = Tag.objects.create(user=self.user, name='Old')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipes = [self.create_recipe(i) for i in range(4)]
+
+    def create_recipe(self, index, user=None):
+        recipe = Recipe.objects.create(
+            user=user or self.user, title=f'recipe {index}',
+            time_minutes=10, price=Decimal('5.25'))
+        if user is None:
+            recipe.tags.add(self.old)
+            recipe.ingredients.add(self.salt)
+        return recipe
+
+    def test_bulk_update(self):
+        """Test updating columns and relations of many recipes."""
+        first, second = self.recipes[:2]
+        payload = [
+            {'id': first.id, 'title': 'Soup', 'tags': [{'name': 'New'}]},
+            {'id': second.id, 'title': 'Soup', 'price': '1.50'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['updated'], 2)
+        self.assertEqual(
+            [r['status'] for r in res.data['results']], ['updated'] * 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.title, first.price), ('Soup', Decimal('5.25')))
+        self.assertEqual(
+            (second.title, second.price), ('Soup', Decimal('1.50')))
+        self.assertEqual(
+            list(first.tags.values_list('name', flat=True)), ['New'])
+        self.assertEqual(
+            list(second.tags.values_list('name', flat=True)), ['Old'])
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Old': 3, 'New': 1})
+
+    def test_bulk_update_reports_bad_rows(self):
+        """Test invalid rows fail alone with their errors."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        other = self.create_recipe(9, user=other_user)
+        recipe = self.recipes[0]
+        payload = [
+            {'id': recipe.id, 'title': 'Fine'},
+            {'id': recipe.id, 'title': 'Twice'},
+            {'id': other.id, 'title': 'Stolen'},
+            {'title': 'No id'},
+            {'id': self.recipes[1].id, 'price': 'free'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((res.data['updated'], res.data['failed']), (1, 4))
+        results = res.data['results']
+        self.assertEqual([r['index'] for r in results], list(range(5)))
+        self.assertIn('price', results[4]['errors'])
+        other.refresh_from_db()
+        self.assertEqual(other.title, 'recipe 9')
+        self.assertEqual(
+            Recipe.objects.get(id=recipe.id).title, 'Fine')
+
+    def test_bulk_update_query_count_is_flat(self):
+        """Test the number of queries does not grow with the rows."""
+        Tag.objects.create(user=self.user, name='Other')
+        counts = []
+        for recipes in (self.recipes[:1], self.recipes):
+            payload = [{'id': recipe.id, 'title': 'Same',
+                        'tags': [{'name': 'Old'}, {'name': 'Other'}]}
+                       for recipe in recipes]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.patch(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Old': 4, 'Other': 4})
+
+    def test_bulk_delete(self):
+        """Test deleting recipes of the user only."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        other = self.create_recipe(9, user=other_user)
+        ids = [recipe.id for recipe in self.recipes[:3]]
+
+        res = self.client.delete(
+            BULK_URL, [*ids, other.id, 'x'], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((res.data['deleted'], res.data['failed']), (3, 2))
+        self.assertEqual(
+            [r['status'] for r in res.data['results']],
+            ['deleted'] * 3 + ['error'] * 2)
+        self.assertEqual(
+            list(Recipe.objects.filter(user=self.user)), self.recipes[3:])
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+        self.old.refresh_from_db()
+        self.salt.refresh_from_db()
+        self.assertEqual((self.old.recipe_count, self.salt.recipe_count),
+                         (1, 1))
+
+    def test_bulk_delete_invalidates_cache(self):
+        """Test lists read after a bulk delete are fresh."""
+        url = reverse('recipe:recipe-list')
+        self.assertEqual(len(self.client.get(url).data), 4)
+
+        self.client.delete(
+            BULK_URL, [self.recipes[0].id], format='json')
+
+        self.assertEqual(len(self.client.get(url).data), 3)
+
+    def test_bulk_edit_expects_a_list(self):
+        """Test a body that is not a list is rejected."""
+        for method in ('patch', 'delete'):
+            res = getattr(self.client, method)(
+                BULK_URL, {'id': self.recipes[0].id}, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,177 @@
+"""Tests for the response cache of recipe API"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, Tag)
+from recipe.cache import get_modified, get_version, stats
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """return url of one recipe"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': True})
+class ResponseCacheTests(TestCase):
+    """tests for cached list and detail responses"""
+
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'cache@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='soup', price=Decimal('2.00'))
+
+    def test_repeated_list_is_served_from_cache(self):
+        """Test a second identical request runs no query."""
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(stats.as_dict()['hit_ratio'], 0.5)
+        self.assertGreater(stats.as_dict()['stored_bytes'], 0)
+
+    def test_query_params_are_normalized(self):
+        """Test the order of query params does not change the key."""
+        self.client.get(RECIPES_URL, {'page_size': 5, 'tags_mode': 'any'})
+
+        res = self.client.get(f'{RECIPES_URL}?tags_mode=any&page_size=5')
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_write_invalidates_cache(self):
+        """Test changing a recipe bumps the version of its owner."""
+        self.client.get(detail_url(self.recipe.id))
+        version = get_version(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                detail_url(self.recipe.id), {'title': 'stew'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertGreater(get_version(self.user.pk), version)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'stew')
+
+    def test_relation_change_invalidates_cache(self):
+        """Test adding a tag to a recipe invalidates the tag list."""
+        tag = Tag.objects.create(user=self.user, name='hot')
+        self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(tag)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual([t['id'] for t in res.data], [tag.id])
+
+    def test_cache_is_per_user(self):
+        """Test users never see responses cached for another user."""
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data, [])
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={'CONDITIONAL': True})
+class ConditionalGetTests(TestCase):
+    """tests for ETag and Last-Modified handling"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'etag@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                user=self.user, title='soup', price=Decimal('2.00'))
+
+    def test_matching_etag_returns_not_modified(self):
+        """Test a current ETag is answered with 304 and no query."""
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_etag_differs_per_request(self):
+        """Test list, detail and filtered lists have their own ETags."""
+        etags = {
+            self.client.get(RECIPES_URL)['ETag'],
+            self.client.get(RECIPES_URL, {'tags': '1'})['ETag'],
+            self.client.get(detail_url(self.recipe.id))['ETag'],
+            self.client.get(TAGS_URL)['ETag'],
+        }
+
+        self.assertEqual(len(etags), 4)
+
+    def test_write_changes_etag(self):
+        """Test an old ETag no longer matches after a write."""
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='new')
+
+        res = self.client.get(
+            detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    @patch('recipe.cache.time.time')
+    def test_if_modified_since(self, patched_time):
+        """Test Last-Modified is honoured when no ETag is sent."""
+        # the write of setUp happened before this second
+        patched_time.return_value = get_modified(self.user.pk)
+        res = self.client.get(RECIPES_URL)
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @patch('recipe.cache.time.time')
+    def test_write_in_same_second_is_modified(self, patched_time):
+        """Test a write in the second of the last fetch is not missed."""
+        patched_time.return_value = 2000000000.2
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='first')
+        res = self.client.get(RECIPES_URL)
+        self.assertFalse(res.has_header('Last-Modified'))
+        patched_time.return_value = 2000000001.0
+        modified = self.client.get(RECIPES_URL)['Last-Modified']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='second')
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=modified)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,126 @@
+"""Tests for recipe export API"""
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, Tag, Ingredient)
+from recipe.serializers import RecipeDetailSerializer
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class PrivateExportTests(TestCase):
+    """tests for exporting recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'export@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        salt = self.salt = Ingredient.objects.create(
+            user=self.user, name='Salt')
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'recipe {i}', time_minutes=i,
+                price=Decimal('2.50'), description=f'step {i}')
+            recipe.tags.add(vegan)
+            if i % 2:
+                recipe.ingredients.add(salt)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        Recipe.objects.create(
+            user=other, title='hidden', time_minutes=1, price=Decimal('1'))
+
+    def content(self, res):
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test recipes stream as one detail document per line."""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', res['Content-Disposition'])
+        rows = [json.loads(line) for line in self.content(res).splitlines()]
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        self.assertEqual(
+            rows, RecipeDetailSerializer(recipes, many=True).data)
+
+    def test_export_csv(self):
+        """Test recipes stream as csv with names of nested items."""
+        res = self.client.get(EXPORT_URL, {
+            'export_format': 'csv', 'fields': 'title,price,ingredients'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        rows = list(csv.reader(io.StringIO(self.content(res))))
+        self.assertEqual(rows[0], ['title', 'price', 'ingredients'])
+        self.assertEqual(rows[1], ['recipe 4', '2.50', ''])
+        self.assertEqual(rows[2], ['recipe 3', '2.50', 'Salt'])
+        self.assertEqual(len(rows), 6)
+
+    def test_export_filters(self):
+        """Test the list filters apply to the export."""
+        salt = Ingredient.objects.get(name='Salt')
+
+        res = self.client.get(EXPORT_URL, {
+            'ingredients': salt.id, 'fields': 'title'})
+
+        self.assertEqual(
+            self.content(res).splitlines(),
+            ['{"title":"recipe 3"}', '{"title":"recipe 1"}'])
+
+    def test_export_reads_in_chunks(self):
+        """Test nested items are loaded once per chunk."""
+        with patch('recipe.export.CHUNK_SIZE', 2):
+            res = self.client.get(EXPORT_URL)
+            # three chunks with two relation queries each
+            with self.assertNumQueries(7):
+                content = self.content(res)
+
+        self.assertEqual(len(content.splitlines()), 5)
+
+    async def test_export_under_asgi(self):
+        """Test no query is left for the event loop under ASGI."""
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+
+        res = await self.async_client.get(
+            EXPORT_URL, AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.content(res).splitlines()), 5)
+
+    @override_settings(RECIPE_EXPORT={'ASGI_MAX_ROWS': 4})
+    async def test_large_export_refused_under_asgi(self):
+        """Test exports too big to hold in memory are refused."""
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+
+        res = await self.async_client.get(
+            EXPORT_URL, AUTHORIZATION=f'Token {token.key}')
+        narrow = await self.async_client.get(
+            EXPORT_URL, {'ingredients': self.salt.id},
+            AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('export', res.json())
+        self.assertEqual(narrow.status_code, status.HTTP_200_OK)
+
+    def test_export_bad_format(self):
+        """Test an unknown format is rejected."""
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,121 @@
+"""Tests for keyset pagination of recipe API"""
+import base64
+import json
+import re
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, Tag)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def links(response):
+    """return urls of Link header by relation"""
+    header = response.headers.get('Link', '')
+    return {rel: url for url, rel in
+            re.findall(r'<([^>]+)>; rel="(\w+)"', header)}
+
+
+class KeysetPaginationTests(TestCase):
+    """tests for paginated list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'page@example.com', 'testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """create count recipes and return their ids newest first"""
+        ids = [Recipe.objects.create(
+            user=self.user,
+            title=f'recipe {i}',
+            price=Decimal('1.00')).id for i in range(count)]
+        return ids[::-1]
+
+    def test_first_page(self):
+        """Test first page is limited and links to the next one."""
+        ids = self._create_recipes(5)
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], ids[:2])
+        self.assertIn('next', links(res))
+        self.assertNotIn('prev', links(res))
+
+    def test_walk_forward_and_back(self):
+        """Test following next and prev links returns every recipe."""
+        ids = self._create_recipes(5)
+
+        seen = []
+        url = f'{RECIPES_URL}?page_size=2'
+        while url:
+            res = self.client.get(url)
+            seen.extend(r['id'] for r in res.data)
+            last = res
+            url = links(res).get('next')
+        self.assertEqual(seen, ids)
+
+        res = self.client.get(links(last)['prev'])
+        self.assertEqual([r['id'] for r in res.data], ids[2:4])
+        self.assertIn('next', links(res))
+
+    def test_no_count_or_offset(self):
+        """Test pages deep in the list are read without COUNT or OFFSET."""
+        self._create_recipes(6)
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        res = self.client.get(links(res)['next'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(links(res)['next'])
+
+        self.assertEqual(len(res.data), 2)
+        for query in ctx.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+            self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def test_tags_ordered_by_name_then_id(self):
+        """Test tags are split across pages by name and id."""
+        for name in ['b', 'a', 'e', 'c', 'd']:
+            Tag.objects.create(user=self.user, name=name)
+        expected = list(Tag.objects.filter(user=self.user).order_by(
+            '-name', '-id').values_list('id', flat=True))
+
+        seen = []
+        url = f'{TAGS_URL}?page_size=2'
+        while url:
+            res = self.client.get(url)
+            seen.extend(r['id'] for r in res.data)
+            url = links(res).get('next')
+
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns not found."""
+        res = self.client.get(RECIPES_URL, {'cursor': 'broken'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        """Test cursors with values of the wrong type return not found."""
+        for url, position in (
+                (RECIPES_URL, ['abc']), (RECIPES_URL, [None]),
+                (RECIPES_URL, [[1]]), (TAGS_URL, ['name', 'abc']),
+                (TAGS_URL, [None, 1])):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps([0, position]).encode()).decode()
+
+            res = self.client.get(url, {'cursor': cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,14 +1,19 @@
 """Tests for recipe app"""
 
 from decimal import Decimal
+from io import StringIO
 from typing import Any
 
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse
 
 import tempfile
 import os
+import time
 from PIL import Image
 
 from rest_framework.test import APIClient
@@ -438,6 +443,109 @@ class PrivateRecipeAPITest(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_all_tags(self):
+        """Test filtering recipes that have all of the given tags."""
+        r1 = create_recipe(user=self.user, title='Vegan Curry')
+        r2 = create_recipe(user=self.user, title='Vegan Salad')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'tags_mode': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [r1.id])
+
+    def test_filter_by_tags_returns_each_recipe_once(self):
+        """Test a recipe matching several tags is listed once."""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+        self.assertNotIn('DISTINCT', ctx.captured_queries[0]['sql'])
+
+    def test_filter_invalid_params(self):
+        """Test invalid ids and modes return a bad request."""
+        for params in ({'tags': '1,x'}, {'tags': '1', 'tags_mode': 'some'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_by_prefix(self):
+        """Test searching recipes by prefixes of title words."""
+        r1 = create_recipe(user=self.user, title='Chicken Curry',
+                           description='')
+        create_recipe(user=self.user, title='Lentil Soup', description='')
+        other = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other, title='Chicken Soup')
+
+        res = self.client.get(RECIPES_URL, {'search': 'chick cur'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [r1.id])
+
+    def test_search_ranks_title_first(self):
+        """Test title matches come before description matches."""
+        in_description = create_recipe(
+            user=self.user, title='Stew', description='with fresh basil')
+        in_title = create_recipe(
+            user=self.user, title='Basil Pesto', description='')
+        in_title.title = 'Basil Pesto Pasta'
+        in_title.save()
+
+        res = self.client.get(RECIPES_URL, {'search': 'basil'})
+
+        self.assertEqual([r['id'] for r in res.data],
+                         [in_title.id, in_description.id])
+
+    def test_search_pages_by_rank(self):
+        """Test search results are paginated in rank order."""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Pie {i}',
+                          description='pie ' * i)
+        Recipe.objects.filter(title='Pie 2').delete()
+
+        first = self.client.get(RECIPES_URL, {'search': 'pie',
+                                              'page_size': 1})
+        url = first['Link'].split(';')[0].strip('<>')
+        second = self.client.get(url)
+
+        ids = [r['id'] for r in first.data + second.data]
+        self.assertEqual(len(set(ids)), 2)
+        self.assertNotIn('rel="next"', second['Link'])
+
+    def test_search_pages_through_ties(self):
+        """Test paging one by one returns every match once, in order."""
+        for i in range(6):
+            create_recipe(user=self.user, title=f'Pie {i}',
+                          description='pie ' * (i % 3))
+
+        res = self.client.get(RECIPES_URL, {'search': 'pie', 'page_size': 1})
+        ids = [r['id'] for r in res.data]
+        while 'rel="next"' in res['Link']:
+            res = self.client.get(res['Link'].split(';')[0].strip('<>'))
+            ids += [r['id'] for r in res.data]
+
+        full = self.client.get(RECIPES_URL, {'search': 'pie'})
+        self.assertEqual(ids, [r['id'] for r in full.data])
+        self.assertEqual(len(set(ids)), 6)
+
+    def test_search_without_words(self):
+        """Test a search of only punctuation matches nothing."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'search': '"*:&'})
+
+        self.assertEqual(res.data, [])
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
@@ -469,6 +577,117 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_returns_pending(self):
+        """Test upload returns at once with a pending image."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file},
+                                   format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], 'pending')
+
+    @override_settings(RECIPE_IMAGES={'SYNC': True, 'MAX_SIZE': 20})
+    def test_uploaded_image_is_processed(self):
+        """Test background processing downscales and strips EXIF."""
+        url = image_upload_url(self.recipe.id)
+        exif = Image.Exif()
+        exif[0x010f] = 'test camera'
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (100, 50)).save(
+                image_file, format='JPEG', exif=exif)
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'image': image_file},
+                                 format='multipart')
+                uploaded = Recipe.objects.get(id=self.recipe.id).image.path
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertFalse(os.path.exists(uploaded))
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.size, (20, 10))
+            self.assertEqual(len(img.getexif()), 0)
+
+    @override_settings(RECIPE_IMAGES={'SYNC': True})
+    def test_broken_image_is_marked_failed(self):
+        """Test an upload that can not be decoded ends as failed."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.effect_noise((200, 200), 50).save(image_file, format='PNG')
+            image_file.truncate(image_file.tell() // 2)
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': image_file},
+                                       format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'failed')
+
+    @override_settings(RECIPE_IMAGES={'SYNC': True})
+    def test_bmp_and_tiff_are_accepted(self):
+        """Test formats accepted before processing still are."""
+        url = image_upload_url(self.recipe.id)
+        for image_format, suffix in (('BMP', '.bmp'), ('TIFF', '.tif')):
+            with tempfile.NamedTemporaryFile(suffix=suffix) as image_file:
+                Image.new('RGB', (10, 10)).save(
+                    image_file, format=image_format)
+                image_file.seek(0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    res = self.client.post(url, {'image': image_file},
+                                           format='multipart')
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.recipe.refresh_from_db()
+            self.assertEqual(self.recipe.image_status, 'ready')
+            self.assertTrue(self.recipe.image.name.endswith('.jpg'))
+
+    @override_settings(RECIPE_IMAGES={'SYNC': True})
+    def test_cmyk_image_drops_profile(self):
+        """Test a CMYK upload is stored as RGB without its CMYK profile."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('CMYK', (10, 10)).save(
+                image_file, format='JPEG', icc_profile=b'cmyk profile')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'image': image_file},
+                                 format='multipart')
+
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.mode, 'RGB')
+            self.assertNotIn('icc_profile', img.info)
+
+    @override_settings(RECIPE_IMAGES={'SYNC': True, 'RECOVER_AFTER': 60})
+    def test_lost_image_is_recovered(self):
+        """Test images a restart left pending are processed again."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            # the job is lost with the worker, its callback never runs
+            self.client.post(url, {'image': image_file}, format='multipart')
+        self.recipe.refresh_from_db()
+
+        call_command('recover_images', stdout=StringIO())
+        self.assertEqual(
+            Recipe.objects.get(id=self.recipe.id).image_status, 'pending')
+
+        uploaded = time.time() - 120
+        os.utime(self.recipe.image.path, (uploaded, uploaded))
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image_status=Recipe.ImageStatus.PROCESSING)
+        out = StringIO()
+        call_command('recover_images', stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertIn('1 lost images processed', out.getvalue())
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image."""
         url = image_upload_url(self.recipe.id)
@@ -476,3 +695,252 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeQueryBudgetTests(TestCase):
+    """Tests for the number of queries per recipe API action."""
+
+    # maximum number of queries each action may issue, whatever the
+    # number of recipes, tags and ingredients involved
+    QUERY_BUDGETS = {
+        'list': 3,
+        'retrieve': 3,
+        'upload_image': 2,
+    }
+
+    def _count_queries(self, method, url, payload):
+        """return number of queries used by one request"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = getattr(self.client, method)(url, payload, format='json')
+        self.assertIn(res.status_code, (200, 201))
+        return len(ctx.captured_queries)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='budget@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _create_recipes(self, count):
+        """create recipes with a few tags and ingredients each"""
+        recipes = []
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'recipe {i}')
+            for j in range(3):
+                recipe.tags.add(Tag.objects.create(
+                    user=self.user, name=f'tag {recipe.id} {j}'))
+                recipe.ingredients.add(Ingredient.objects.create(
+                    user=self.user, name=f'ingredient {recipe.id} {j}'))
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_query_budget(self):
+        """Test listing recipes uses a fixed number of queries."""
+        for count in (1, 10):
+            self._create_recipes(count)
+            with self.assertNumQueries(self.QUERY_BUDGETS['list']):
+                res = self.client.get(RECIPES_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(all(len(r['tags']) == 3 for r in res.data))
+
+    def test_retrieve_query_budget(self):
+        """Test retrieving a recipe uses a fixed number of queries."""
+        recipe = self._create_recipes(1)[0]
+
+        with self.assertNumQueries(self.QUERY_BUDGETS['retrieve']):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['ingredients']), 3)
+
+    def test_upload_image_query_budget(self):
+        """Test uploading an image does not load tags or ingredients."""
+        recipe = self._create_recipes(1)[0]
+        url = image_upload_url(recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.assertNumQueries(self.QUERY_BUDGETS['upload_image']):
+                res = self.client.post(
+                    url, {'image': image_file}, format='multipart')
+
+        recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.image.delete()
+
+    def test_create_nested_query_count_is_flat(self):
+        """Test creating a recipe costs the same with 1 or 30 items."""
+        counts = []
+        for size in (1, 30):
+            payload = {
+                'title': f'recipe {size}',
+                'time_minutes': 5,
+                'price': Decimal('1.50'),
+                'tags': [{'name': f'tag {size} {i}'} for i in range(size)],
+                'ingredients': [
+                    {'name': f'ingr {size} {i}'} for i in range(size)],
+            }
+            counts.append(self._count_queries('post', RECIPES_URL, payload))
+
+        self.assertEqual(counts[0], counts[1])
+        recipe = Recipe.objects.get(user=self.user, title='recipe 30')
+        self.assertEqual(recipe.ingredients.count(), 30)
+
+    def test_update_nested_query_count_is_flat(self):
+        """Test updating nested items costs the same with 1 or 30 items."""
+        counts = []
+        for size in (1, 30):
+            recipe = create_recipe(user=self.user)
+            old_tag = Tag.objects.create(user=self.user, name=f'old {size}')
+            recipe.tags.add(old_tag)
+            payload = {
+                'tags': [{'name': f'tag {size} {i}'} for i in range(size)]}
+            counts.append(
+                self._count_queries('patch', detail_url(recipe.id), payload))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(recipe.tags.count(), 30)
+
+
+@override_settings(RECIPE_FAST_LIST=True)
+class FastRecipeListTests(TestCase):
+    """Tests for listing recipes from values() rows."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='fast@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_fast_list_matches_serializer(self):
+        """Test fast list returns the same data as the serializer."""
+        create_recipe(user=self.user, title='plain', price=Decimal('10'))
+        recipe = create_recipe(user=self.user, link='')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'),
+            Ingredient.objects.create(user=self.user, name='Kale'),
+        )
+
+        res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), serializer.data)
+
+    def test_fast_list_filters_and_pages(self):
+        """Test fast list keeps filters and the Link header."""
+        tag = Tag.objects.create(user=self.user, name='Soup')
+        for i in range(3):
+            create_recipe(user=self.user, title=f'r{i}').tags.add(tag)
+        create_recipe(user=self.user, title='untagged')
+
+        res = self.client.get(RECIPES_URL, {'tags': tag.id, 'page_size': 2})
+
+        self.assertEqual([r['title'] for r in res.data], ['r2', 'r1'])
+        self.assertIn('rel="next"', res['Link'])
+
+    def test_fast_list_query_count(self):
+        """Test fast list uses three queries whatever the page size."""
+        for i in range(10):
+            recipe = create_recipe(user=self.user, title=f'recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'tag {i}'))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 10)
+
+
+class SparseFieldsTests(TestCase):
+    """Tests for the fields and expand params."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='sparse@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user, title='soup')
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Hot'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Leek'))
+
+    def test_list_fields(self):
+        """Test only the fields asked for are listed, in one query."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'title,id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), [{'id': self.recipe.id, 'title': 'soup'}])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"price"', ctx.captured_queries[0]['sql'])
+
+    def test_expand(self):
+        """Test nested relations not expanded are dropped unqueried."""
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, {'expand': 'tags'})
+
+        self.assertEqual(res.data[0]['tags'], [
+            {'id': self.recipe.tags.get().id, 'name': 'Hot'}])
+        self.assertNotIn('ingredients', res.data[0])
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {'expand': ''})
+
+        self.assertEqual(set(res.data[0]), {
+            'id', 'title', 'price', 'time_minutes', 'link'})
+
+    def test_retrieve_fields(self):
+        """Test detail fields can be dropped and are deferred."""
+        url = detail_url(self.recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, {'fields': 'id,ingredients'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data), {'id', 'ingredients'})
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertNotIn('"description"', ctx.captured_queries[0]['sql'])
+
+        res = self.client.get(url, {'fields': 'description'})
+
+        self.assertEqual(res.data, {'description': 'test recipe description'})
+
+    def test_unknown_fields(self):
+        """Test unknown names are rejected."""
+        for params in ({'fields': 'title,secret'}, {'expand': 'title'},
+                       {'fields': 'description'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_ignore_fields(self):
+        """Test write actions render every field."""
+        res = self.client.patch(
+            detail_url(self.recipe.id) + '?fields=id', {'title': 'stew'},
+            format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'stew')
+        self.assertIn('tags', res.data)
+
+    @override_settings(RECIPE_FAST_LIST=True)
+    def test_fast_list_fields(self):
+        """Test fast list returns the same sparse data."""
+        params = {'fields': 'id,price,tags'}
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, params)
+
+        expected = RecipeSerializer(
+            Recipe.objects.filter(user=self.user),
+            many=True, fields=params['fields'].split(',')).data
+        self.assertEqual(res.json(), expected)
@@ -87,6 +87,17 @@ class PrivateTAGsTest(TestCase):
         self.assertEqual(tag.id, tag.id)
         self.assertEqual(tag.user, self.user)
 
+    def test_renaming_tag_to_used_name(self) -> None:
+        """test renaming a tag to a name the user has fails"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag: Any = Tag.objects.create(user=self.user, name='Dinner')
+
+        res: Any = self.client.patch(detail_url(tag.id), {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dinner')
+
     def test_delete_tag(self) -> None:
         """test for deleting tag"""
         tag: dict[str, str] = Tag.objects.create(
@@ -137,3 +148,126 @@ class PrivateTAGsTest(TestCase):
         recipe2.tags.add(tag1)
         res = self.client.get(TAGS_URL, {'assignet_only': 1})
         self.assertEqual(len(res.data), 1)
+
+    def test_filter_tags_assigned_only(self):
+        """Test the documented assigned_only param filters unused tags."""
+        tag1 = Tag.objects.create(user=self.user, name='tag1')
+        Tag.objects.create(user=self.user, name='tag2')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='recipe',
+            time_minutes=10,
+            price=Decimal('2.5')
+        )
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t['id'] for t in res.data], [tag1.id])
+
+
+class RecipeCountTests(TestCase):
+    """Tests for the recipe_count of tags."""
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag1 = Tag.objects.create(user=self.user, name='tag1')
+        self.tag2 = Tag.objects.create(user=self.user, name='tag2')
+        self.recipe = self.create_recipe()
+
+    def create_recipe(self, title='recipe') -> Recipe:
+        return Recipe.objects.create(
+            user=self.user, title=title, time_minutes=10,
+            price=Decimal('2.5'))
+
+    def counts(self) -> dict:
+        return dict(Tag.objects.values_list('name', 'recipe_count'))
+
+    def test_list_with_recipe_count(self) -> None:
+        """Test the count is only listed when asked for."""
+        self.recipe.tags.add(self.tag1)
+
+        res = self.client.get(TAGS_URL, {'recipe_count': 1})
+        plain = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {t['name']: t['recipe_count'] for t in res.data},
+            {'tag1': 1, 'tag2': 0})
+        self.assertNotIn('recipe_count', plain.data[0])
+
+    def test_recipe_count_adds_no_queries(self) -> None:
+        """Test counts are read from the tag rows."""
+        for i in range(3):
+            self.create_recipe(f'recipe {i}').tags.add(self.tag1, self.tag2)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {'recipe_count': 1})
+
+        self.assertEqual(res.data[0]['recipe_count'], 3)
+
+    def test_count_follows_relation_changes(self) -> None:
+        """Test adding, setting, removing and clearing tags of a recipe."""
+        self.recipe.tags.add(self.tag1, self.tag2)
+        self.recipe.tags.add(self.tag1)
+        self.assertEqual(self.counts(), {'tag1': 1, 'tag2': 1})
+
+        self.recipe.tags.set([self.tag2])
+        self.assertEqual(self.counts(), {'tag1': 0, 'tag2': 1})
+
+        self.recipe.tags.remove(self.tag1, self.tag2)
+        self.assertEqual(self.counts(), {'tag1': 0, 'tag2': 0})
+
+        self.recipe.tags.add(self.tag1, self.tag2)
+        self.recipe.tags.clear()
+        self.assertEqual(self.counts(), {'tag1': 0, 'tag2': 0})
+
+    def test_count_follows_reverse_changes(self) -> None:
+        """Test changing the recipes of a tag."""
+        other = self.create_recipe('other')
+
+        self.tag1.recipe_set.add(self.recipe, other)
+        self.assertEqual(self.counts()['tag1'], 2)
+
+        self.tag1.recipe_set.remove(other)
+        self.assertEqual(self.counts()['tag1'], 1)
+
+        self.tag1.recipe_set.clear()
+        self.assertEqual(self.counts()['tag1'], 0)
+
+    def test_deleting_recipe_uncounts_it(self) -> None:
+        """Test a deleted recipe no longer counts."""
+        self.recipe.tags.add(self.tag1)
+        self.create_recipe('other').tags.add(self.tag1)
+
+        self.recipe.delete()
+
+        self.assertEqual(self.counts(), {'tag1': 1, 'tag2': 0})
+
+    def test_count_through_recipe_api(self) -> None:
+        """Test creating and updating recipes keeps counts."""
+        recipes_url = reverse('recipe:recipe-list')
+        res = self.client.post(recipes_url, {
+            'title': 'new', 'time_minutes': 5, 'price': '1.00',
+            'tags': [{'name': 'tag1'}, {'name': 'tag3'}],
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.counts(), {'tag1': 1, 'tag2': 0, 'tag3': 1})
+
+        res = self.client.patch(
+            reverse('recipe:recipe-detail', args=[res.data['id']]),
+            {'tags': [{'name': 'tag2'}]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.counts(), {'tag1': 0, 'tag2': 1, 'tag3': 0})
+
+    def test_recount(self) -> None:
+        """Test counts are rebuilt from the relation table."""
+        self.recipe.tags.add(self.tag1)
+        Tag.objects.update(recipe_count=5)
+
+        Tag.objects.recount()
+
+        self.assertEqual(self.counts(), {'tag1': 1, 'tag2': 0})
@@ -1,6 +1,11 @@
 """
 Views for recipe API
 """
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -14,16 +19,42 @@ from rest_framework import (
     status, )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication, )
 from core.models import (
     Recipe,
     Tag,
     Ingredient, )
+from core.parsers import NDJSONParser, ORJSONParser
+
+from recipe import export, filters, images, readers, serializers
+from recipe.async_views import AsyncReadMixin
+from recipe.bulk import RecipeBulkEditor, RecipeImporter
+from recipe.cache import CachedResponseMixin, bump_version
+from recipe.pagination import (
+    RecipePagination,
+    NamedPagination,
+    SearchPagination, )
 
-from recipe import serializers
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='coma separated list of fields to return, '
+                    'all by default'
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description='coma separated list of nested tags or ingredients '
+                    'to return, all by default, empty for none'
+    ),
+]
 
 
 @extend_schema_view(
@@ -34,75 +65,249 @@ from recipe import serializers
                 OpenApiTypes.INT, enum=[0, 1],
                 description='filter unique items for recipe'
             ),
+            OpenApiParameter(
+                'recipe_count',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='add the number of recipes using each item'
+            ),
         ]
     )
 )
-class BaseClass(mixins.DestroyModelMixin,
+class BaseClass(AsyncReadMixin,
+                CachedResponseMixin,
+                mixins.DestroyModelMixin,
                 mixins.UpdateModelMixin,
                 mixins.ListModelMixin,
                 viewsets.GenericViewSet):
     """vase class for views"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = NamedPagination
+    # name of the Recipe relation to the model of the view
+    recipe_field = None
+    # serializer of list items with their recipe_count
+    count_serializer_class = None
+
+    def _flag(self, name, alias=None) -> bool:
+        """return value of a 0 or 1 query param"""
+        params = self.request.query_params
+        value = params.get(name, params.get(alias, 0) if alias else 0)
+        try:
+            return bool(int(value))
+        except ValueError:
+            raise ValidationError({name: 'expected 0 or 1'})
+
+    def _assigned_only(self) -> bool:
+        """return value of assigned_only param"""
+        # assignet_only is the misspelled name accepted by old clients
+        return self._flag('assigned_only', 'assignet_only')
+
+    def get_serializer_class(self):
+        """items of a list carry recipe_count when asked for"""
+        if self.action == 'list' and self._flag('recipe_count'):
+            return self.count_serializer_class
+        return self.serializer_class
 
     def get_queryset(self):
         """get all tags for auth user"""
-        assignet_only = bool(
-            int(self.request.query_params.get('assignet_only', 0))
-        )
         queryset = self.queryset
-        if assignet_only:
-            queryset = queryset.filter(recipe__isnull=False)
+        if self._assigned_only():
+            queryset = filters.filter_assigned(queryset, self.recipe_field)
 
         return queryset.filter(
                         user=self.request.user
-                        ).order_by('-name').distinct()
+                        ).order_by('-name', '-id')
+
+    def perform_update(self, serializer):
+        """rename an item, names are unique per user"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': 'this name is already used'})
 
 
 @extend_schema_view(
     list=extend_schema(
         parameters=[
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='words of title or description, results are '
+                            'ordered by relevance'
+            ),
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
                 description='coma separated list of ids of tags'
             ),
+            OpenApiParameter(
+                'tags_mode',
+                OpenApiTypes.STR, enum=list(filters.MATCH_MODES),
+                description='match recipes with any (default) '
+                            'or all of the tags'
+            ),
             OpenApiParameter(
                 'ingredients',
                 OpenApiTypes.STR,
                 description='coma separated list of ids of ingredients'
-            )
+            ),
+            OpenApiParameter(
+                'ingredients_mode',
+                OpenApiTypes.STR, enum=list(filters.MATCH_MODES),
+                description='match recipes with any (default) '
+                            'or all of the ingredients'
+            ),
+            *SPARSE_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncReadMixin,
+                    CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """
     view set for recipe API
     """
 
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipePagination
+    # actions whose serializer renders nested tags and ingredients
+    nested_actions = ('list', 'retrieve', 'create', 'update', 'partial_update')
+    # actions accepting the fields and expand params
+    sparse_actions = ('list', 'retrieve', 'export_recipes')
+    # throttle buckets of the expensive actions, see core.throttling
+    throttle_scopes = {
+        'create': 'create',
+        # bulk writes share the bucket of creates
+        'bulk_create': 'create',
+        'bulk_update': 'create',
+        'bulk_destroy': 'create',
+        'upload_image': 'upload',
+    }
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _filter_related(self, queryset, field):
+        """filter queryset by ids and match mode of field params"""
+        params = self.request.query_params
+        mode = params.get(f'{field}_mode', filters.MATCH_ANY)
+        if mode not in filters.MATCH_MODES:
+            raise ValidationError(
+                {f'{field}_mode': f'expected one of {filters.MATCH_MODES}'})
+        try:
+            ids = self._params_to_ints(params[field])
+        except ValueError:
+            raise ValidationError({field: 'expected comma separated ids'})
+        return filters.filter_by_related(queryset, field, ids, mode)
+
+    def _search_text(self):
+        """return text of search param of list requests"""
+        if getattr(self, 'action', None) != 'list' or self.request is None:
+            return None
+        return self.request.query_params.get('search') or None
+
+    def _param_names(self, name, allowed) -> list[str]:
+        """return names of a coma separated param, all of them allowed"""
+        names = [value.strip() for value in
+                 self.request.query_params[name].split(',')
+                 if value.strip()]
+        unknown = [value for value in names if value not in allowed]
+        if unknown:
+            raise ValidationError(
+                {name: f'unknown fields {unknown}, expected some of '
+                       f'{list(allowed)}'})
+        return names
+
+    def _sparse_fields(self):
+        """
+        return fields to render for the fields and expand params,
+        in serializer order, None when every field is rendered
+        """
+        if not hasattr(self, '_fields'):
+            self._fields = None
+            params = getattr(self.request, 'query_params', {})
+            if (getattr(self, 'action', None) in self.sparse_actions
+                    and ('fields' in params or 'expand' in params)):
+                available = self.get_serializer_class().Meta.fields
+                nested = readers.NESTED_FIELDS
+                fields = self._param_names('fields', available) \
+                    if 'fields' in params else available
+                expand = self._param_names('expand', nested) \
+                    if 'expand' in params else nested
+                self._fields = tuple(
+                    name for name in available if name in fields
+                    and (name not in nested or name in expand))
+        return self._fields
+
+    @property
+    def paginator(self):
+        """paginator of the view, search results are paged by rank"""
+        if not hasattr(self, '_paginator'):
+            if self._search_text() is not None:
+                self._paginator = SearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        for field in ('tags', 'ingredients'):
+            if self.request.query_params.get(field):
+                queryset = self._filter_related(queryset, field)
+        text = self._search_text()
+        if text is not None:
+            queryset = filters.search(queryset, text)
+        fields = self._sparse_fields()
+        if self.action in self.nested_actions:
+            queryset = queryset.prefetch_related(*(
+                name for name in readers.NESTED_FIELDS
+                if fields is None or name in fields))
+        if fields is not None:
+            # the primary key is always needed, also to prefetch
+            queryset = queryset.only('id', *(
+                name for name in fields
+                if name not in readers.NESTED_FIELDS))
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by('-id')
+
+    def list(self, request, *args, **kwargs):
+        if getattr(settings, 'RECIPE_FAST_LIST', False):
+            return self.cached_response(
+                self.fast_list, request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
+
+    def fast_list(self, request, *args, **kwargs):
+        """
+        List recipes from values() rows instead of model instances.
+        Same response as list, built without the serializers.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self._sparse_fields()
+        columns = readers.RECIPE_COLUMNS if fields is None else tuple(
+            dict.fromkeys(('id', *(name for name in fields
+                                   if name in readers.RECIPE_COLUMNS))))
+        # annotations such as search_rank are kept for the paginator
+        queryset = queryset.prefetch_related(None).values(
+            *columns, *queryset.query.annotations)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                readers.recipe_rows(page, fields))
+        return Response(readers.recipe_rows(queryset, fields))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
 
     def get_serializer_class(self):
         """return the valid serializer class"""
@@ -112,32 +317,173 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeImageSerializer
         return serializers.RecipeDetailSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        """serializer rendering the fields asked for"""
+        fields = self._sparse_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         """create a new recipe"""
         serializer.save(user=self.request.user)
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to recipe."""
+        """
+        Upload an image to recipe.
+        The file is stored as it is, decoding and resizing run in the
+        background and image_status tells when they are done.
+        """
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(image_status=Recipe.ImageStatus.PENDING)
+            images.schedule(recipe.id)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'export_format',
+                OpenApiTypes.STR, enum=[*export.FORMATS],
+                description='ndjson (default) or csv'
+            ),
+            *SPARSE_PARAMETERS,
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(methods=['GET'], detail=False, url_path='export',
+            url_name='export')
+    def export_recipes(self, request):
+        """
+        Stream recipes of the user as NDJSON or CSV.
+        Takes the filters of the list, recipes are read in chunks
+        so the export of any account uses the same memory. Under ASGI
+        Django 4.0 iterates the content on the event loop, where no
+        query may run, so the export is read here and held in memory,
+        exports above RECIPE_EXPORT ASGI_MAX_ROWS are refused.
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in export.FORMATS:
+            raise ValidationError(
+                {'export_format': f'expected one of {list(export.FORMATS)}'})
+        fields = self._sparse_fields() or \
+            self.get_serializer_class().Meta.fields
+        queryset = self.filter_queryset(self.get_queryset())
+        content = export.stream(queryset, fields, export_format)
+        if isinstance(request._request, ASGIRequest):
+            limit = export.get_options()['ASGI_MAX_ROWS']
+            if queryset.count() > limit:
+                raise ValidationError({'export': (
+                    f'exports of more than {limit} recipes are not '
+                    'served here, narrow it down with the list filters')})
+            content = list(content)
+        response = StreamingHttpResponse(
+            content, content_type=export.FORMATS[export_format])
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{export_format}"'
+        return response
+
+    @extend_schema(
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses={201: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT},
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk',
+            parser_classes=[ORJSONParser, NDJSONParser])
+    def bulk_create(self, request):
+        """
+        Create many recipes from a JSON array or a NDJSON stream.
+        Returns one result per row, in the order of the input.
+        """
+        rows = self._bulk_rows(request)
+        if rows is None:
+            return Response(
+                {'detail': 'Expected a list of recipes.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        importer = RecipeImporter(
+            request.user, self.get_serializer_context())
+        return self._bulk_response(importer.run(rows), 'created')
+
+    @extend_schema(
+        request=OpenApiTypes.OBJECT,
+        responses={200: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT},
+    )
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        """
+        Update many recipes, each row holds the id of a recipe and its
+        changed fields as in a PATCH of the recipe.
+        Returns one result per row, in the order of the input.
+        """
+        rows = self._bulk_rows(request)
+        if rows is None:
+            return Response(
+                {'detail': 'Expected a list of recipes.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        editor = RecipeBulkEditor(request.user, self.get_serializer_context())
+        return self._bulk_response(editor.update(rows), 'updated')
+
+    @extend_schema(
+        request=OpenApiTypes.OBJECT,
+        responses={200: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT},
+    )
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        """
+        Delete many recipes from a list of ids.
+        Returns one result per id, in the order of the input.
+        """
+        ids = self._bulk_rows(request)
+        if ids is None:
+            return Response(
+                {'detail': 'Expected a list of ids.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        editor = RecipeBulkEditor(request.user, self.get_serializer_context())
+        return self._bulk_response(editor.delete(ids), 'deleted')
+
+    @staticmethod
+    def _bulk_rows(request):
+        """return rows of a bulk request body, None when not a list"""
+        rows = request.data
+        if isinstance(rows, (dict, str)) or not hasattr(rows, '__iter__'):
+            return None
+        return rows
+
+    def _bulk_response(self, results, done) -> Response:
+        """summarize results whose status is done or error"""
+        # bulk writes send no signals
+        bump_version(self.request.user.pk)
+        count = sum(1 for row in results if row['status'] == done)
+        if count == len(results):
+            response_status = (status.HTTP_201_CREATED if done == 'created'
+                               else status.HTTP_200_OK)
+        elif count:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            done: count,
+            'failed': len(results) - count,
+            'results': results, }, status=response_status)
+
 
 class TagAPIView(BaseClass):
 
     """Views for TAG models."""
     serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
     queryset = Tag.objects.all()
+    recipe_field = 'tags'
 
 
 class IngredientAPIVew(BaseClass):
     """views for ingredient model"""
 
     serializer_class = serializers.IngredientSerializer
+    count_serializer_class = serializers.IngredientCountSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
@@ -6,6 +6,8 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.authentication import read_refresh_token
+
 
 class UserSerializer(serializers.ModelSerializer):
     """serializer for model User"""
@@ -55,3 +57,19 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for renewing an access token."""
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        """Validate the refresh token and return its Token and user."""
+        token = read_refresh_token(attrs.get('refresh'))
+        if token is None or not token.user.is_active:
+            msg = _('Invalid refresh token.')
+            raise serializers.ValidationError(msg, code='authorization')
+
+        attrs['token'] = token
+        attrs['user'] = token.user
+        return attrs
@@ -7,9 +7,12 @@ from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
+ACCESS_URL = reverse('user:token-access')
+REFRESH_URL = reverse('user:token-refresh')
 ME_URL = reverse('user:me')
 
 
@@ -109,6 +112,75 @@ class PublicUserAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class AccessTokenAPITests(TestCase):
+    """test access token and refresh endpoints"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='access@example.com', password='testpass123')
+
+    def test_create_access_token(self):
+        """Test credentials give an access and a refresh token."""
+        res = self.client.post(ACCESS_URL, {
+            'email': 'access@example.com', 'password': 'testpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['token_type'], 'Bearer')
+        self.assertGreater(res.data['expires_in'], 0)
+        self.assertNotEqual(res.data['refresh'], self.user.auth_token.key)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {res.data["access"]}')
+        self.assertEqual(
+            self.client.get(ME_URL).data['email'], 'access@example.com')
+
+    def test_refresh_token_is_no_credential(self):
+        """Test a refresh token authenticates no other endpoint."""
+        refresh = self.client.post(ACCESS_URL, {
+            'email': 'access@example.com',
+            'password': 'testpass123'}).data['refresh']
+
+        for keyword in ('Bearer', 'Token'):
+            self.client.credentials(HTTP_AUTHORIZATION=f'{keyword} {refresh}')
+            res = self.client.get(ME_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_create_access_token_bad_credentials(self):
+        """Test wrong credentials give no token."""
+        res = self.client.post(ACCESS_URL, {
+            'email': 'access@example.com', 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('access', res.data)
+
+    def test_refresh_access_token(self):
+        """Test a refresh token gives a new access token."""
+        refresh = self.client.post(ACCESS_URL, {
+            'email': 'access@example.com',
+            'password': 'testpass123'}).data['refresh']
+
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('access', res.data)
+        res = self.client.post(REFRESH_URL, {'refresh': res.data['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_refresh_rejects_revoked_token(self):
+        """Test a deleted or unknown refresh token is rejected."""
+        refresh = self.client.post(ACCESS_URL, {
+            'email': 'access@example.com',
+            'password': 'testpass123'}).data['refresh']
+        self.user.auth_token.delete()
+
+        Token.objects.create(user=self.user)
+
+        for token in (refresh, 'unknown'):
+            res = self.client.post(REFRESH_URL, {'refresh': token})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class PrivateUserAPITests(TestCase):
     """Test cases for privet methods users can access."""
     def setUp(self):
@@ -9,5 +9,9 @@ app_name = 'user'
 urlpatterns = [
         path('create/', views.CreateUserAPIView.as_view(), name='create'),
         path('token/', views.CreateTokenView.as_view(), name='token'),
+        path('token/access/', views.CreateAccessTokenView.as_view(),
+             name='token-access'),
+        path('token/refresh/', views.RefreshAccessTokenView.as_view(),
+             name='token-refresh'),
         path('me/', views.ManageUserView.as_view(), name='me')
         ]
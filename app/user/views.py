@@ -1,9 +1,31 @@
 '''Views for user model'''
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from user.serializers import (UserSerializer, AuthTokenSerializer)
+from core.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+    issue_access_token,
+    issue_refresh_token,
+    load_user, )
+from core.throttling import TokenBucketThrottle
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    RefreshTokenSerializer, )
+
+
+def access_token_data(token) -> dict:
+    """return response body with new access and refresh tokens of user"""
+    access, ttl = issue_access_token(token.user)
+    return {
+        'access': access,
+        'token_type': SignedTokenAuthentication.keyword,
+        'expires_in': ttl,
+        'refresh': issue_refresh_token(token), }
 
 
 class CreateUserAPIView(generics.CreateAPIView):
@@ -15,14 +37,43 @@ class CreateTokenView(ObtainAuthToken):
     """Create new token"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # ObtainAuthToken turns throttling off, passwords are slow to check
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'token'
+
+
+class CreateAccessTokenView(CreateTokenView):
+    """
+    Create a short lived access token from email and password.
+    Send the refresh token returned with it to the refresh endpoint
+    for a new access token, it is accepted nowhere else.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        return Response(access_token_data(token))
+
+
+class RefreshAccessTokenView(CreateTokenView):
+    """Create new access and refresh tokens from a refresh token."""
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(access_token_data(serializer.validated_data['token']))
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         """Retrieve and return the authenticated user."""
-        return self.request.user
+        return load_user(self.request.user)